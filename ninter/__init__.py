@@ -1,11 +1,29 @@
 """
 Objects to use other interpreters like python.
 Now, R and Deno is available.
+
+numpy, pandas and asyncio are imported when they are needed
+to keep 'import ninter' fast.
 """
+from typing import Any
 from . import interpreter
 from . import base
+from . import warm
 from .base import Bridge, Let, Const
 from .interpreter import R, Deno
+from .pool import InterpreterPool
+from .warm import keep_warm, stop_warm
+
+# Names of ninter.aio imported when they are used.
+_AIO_NAMES = ('AsyncR', 'AsyncDeno', 'AsyncBridge',
+              'start_async_r', 'start_async_deno')
+
+
+def __getattr__(name: str) -> Any:
+    if name in _AIO_NAMES:
+        from . import aio
+        return getattr(aio, name)
+    raise AttributeError(f"module 'ninter' has no attribute '{name}'")
 
 
 def start_r():
@@ -0,0 +1,331 @@
+'''
+asyncio version of Interpreter.
+It does not block event loop while other interpreter is working.
+
+A reader task receives responses and passes them to futures
+by the stamp keys. And so, many requests can be outstanding at once
+and many coroutines can share one interpreter.
+
+>>> r = await AsyncR()
+>>> t_test = r['t.test']
+>>> result = await t_test([1, 2, 3, 4], [2, 3, 4, 5])
+>>> print(await result['p.value'].to_python())
+'''
+from typing import Any, Callable, Dict, List, Optional, Union
+from asyncio.subprocess import PIPE, STDOUT
+from collections import deque
+import asyncio
+import threading
+import time
+from .base import (Bridge, Command, Future, Interpreter, InterpreterException,
+                   InterpreterObject, MetadataCache)
+from .interpreter import DenoCommand, DenoObject, RCommand, RObject
+from . import transport
+
+# Limit of a line from other interpreter.
+LINE_LIMIT = 1 << 30
+
+
+class AsyncInterpreter:
+    '''
+    Interpreter which works with asyncio.
+    The command should not be started.
+    Await it to start the interpreter.
+
+    >>> r = await AsyncInterpreter(RCommand(start=False), AsyncRObject)
+    '''
+
+    def __init__(self, command: Command, ObjectClass: type) -> None:
+        self.command = command
+        self.ObjectClass = ObjectClass
+        self.metadata = MetadataCache()
+        self.sent_num = 0
+        # (key, future, convert) in order of sending.
+        self.pending: deque = deque()
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self.live_objects = 0
+        self.garbage: List[str] = []
+        self._gc_lock = threading.RLock()
+        # Instrumentation is not supported yet.
+        self.metrics = None
+
+    # Same as Interpreter.
+    collect_threshold = Interpreter.collect_threshold
+    _queue_delete = Interpreter._queue_delete
+    _make_collect_command = Interpreter._make_collect_command
+    make_remote_variable = Interpreter.make_remote_variable
+
+    def __await__(self) -> Any:
+        return self.start().__await__()
+
+    async def start(self) -> 'AsyncInterpreter':
+        '''
+        Start the interpreter and wait until it is ready.
+        '''
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command.args, stdin=PIPE, stdout=PIPE, stderr=STDOUT,
+            env=self.command.make_env(), limit=LINE_LIMIT)
+        self._reader = asyncio.ensure_future(self._read())
+        ready = self._expect(self.command.make_setup(), None)
+        await self.flush()
+        await ready
+        return self
+
+    def _expect(self, text: str,
+                convert: Optional[Callable[[str], Any]]) -> asyncio.Future:
+        self.sent_num += 1
+        key_to_send, key = self.command.make_key_pair(
+            f'{time.time()}-{self.sent_num}')
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((key, future, convert))
+        self.process.stdin.write((text + key_to_send).encode())
+        return future
+
+    async def _read(self) -> None:
+        strings: List[str] = []
+        while True:
+            line = (await self.process.stdout.readline()).decode()
+            if not line:
+                break
+            if not self.pending:
+                continue
+            key, future, convert = self.pending[0]
+            if line != key:
+                if self.command.is_not_input_head(line):
+                    strings.append(line)
+                continue
+            self.pending.popleft()
+            text = ''.join(strings)
+            strings = []
+            if future.cancelled():
+                continue
+            try:
+                future.set_result(convert(text) if convert else text)
+            except Exception as er:
+                future.set_exception(er)
+        for key, future, convert in self.pending:
+            if not future.done():
+                future.set_exception(
+                    InterpreterException('Interpreter was closed.'))
+        self.pending.clear()
+
+    def submit(self, code: Union[str, InterpreterObject],
+               convert: Optional[Callable[[str], Any]] = None
+               ) -> asyncio.Future:
+        '''
+        Send something and return future without waiting.
+        If code is InterpreterObject, the future is for its to_python.
+        '''
+        if isinstance(code, InterpreterObject):
+            return code._submit()
+        if len(self.garbage) >= self.collect_threshold:
+            collect_code = self._make_collect_command()
+            if collect_code:
+                self._expect(self.command.make_code(collect_code), None)
+        return self._expect(self.command.make_code(code), convert)
+
+    async def send(self, code: str) -> asyncio.Future:
+        '''
+        Send something and return future of the output.
+        '''
+        future = self.submit(code)
+        await self.flush()
+        return future
+
+    async def flush(self) -> None:
+        await self.process.stdin.drain()
+
+    async def get(self, name: str) -> str:
+        '''
+        Get output from interpreter.
+        '''
+        return await (await self.send(name))
+
+    def __getitem__(self, name: str) -> InterpreterObject:
+        return self.ObjectClass(name=name, interpreter=self)
+
+    def make_tmp_variable(self, time_stamp: str) -> str:
+        return self.command.make_tmp_variable(time_stamp)
+
+    async def collect(self) -> int:
+        '''
+        Delete queued tmp variables now and wait for it.
+        '''
+        with self._gc_lock:
+            number = len(self.garbage)
+            code = self._make_collect_command()
+        if code:
+            await self.get(code)
+        return number
+
+    def _make_setitem(self, name: str, value: Any, make_command: Callable,
+                      segments: List[transport.Segment]) -> str:
+        self.metadata.invalidate(name)
+        if isinstance(value, self.ObjectClass):
+            return make_command(name, value._code)
+        return make_command(
+            name, self.ObjectClass._convert_to_interpreter(value, segments))
+
+    async def _setitem(self, name: str, value: Any,
+                       make_command: Callable) -> None:
+        if (isinstance(value, InterpreterObject)
+                and not isinstance(value, self.ObjectClass)):
+            value = await value.to_python()
+        segments: List[transport.Segment] = []
+        try:
+            await self.get(
+                self._make_setitem(name, value, make_command, segments))
+        finally:
+            for segment in segments:
+                segment.release()
+
+    async def set(self, name: str, value: Any) -> None:
+        '''
+        Set object to interpreter and wait for it.
+        '''
+        await self._setitem(name, value, self.command.make_send_command)
+
+    async def let(self, name: str, value: Any) -> None:
+        await self._setitem(name, value, self.command.make_let_command)
+
+    async def const(self, name: str, value: Any) -> None:
+        await self._setitem(name, value, self.command.make_const_command)
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        '''
+        Set object to interpreter without waiting.
+        It is sent in order, but errors are not reported.
+        Use 'await set' for object of other interpreter.
+        '''
+        if (isinstance(value, InterpreterObject)
+                and not isinstance(value, self.ObjectClass)):
+            raise TypeError('Use "await set" for object of other interpreter')
+        segments: List[transport.Segment] = []
+        future = self.submit(self._make_setitem(
+            name, value, self.command.make_send_command, segments))
+        future.add_done_callback(
+            lambda _: [segment.release() for segment in segments])
+
+    async def close(self) -> None:
+        self.process.stdin.write(
+            self.command.make_code(self.command.close()).encode())
+        self.process.stdin.close()
+        await self.process.wait()
+        await self._reader
+
+
+async def _to_python(obj: InterpreterObject) -> Any:
+    future = obj._submit()
+    if isinstance(future, Future):
+        return future.result()
+    return await future
+
+
+class AsyncRObject(RObject):
+    '''
+    RObject for AsyncInterpreter.
+    to_python, metadata and function call should be awaited.
+    '''
+
+    async def to_python(self) -> Any:
+        return await _to_python(self)
+
+    async def metadata(self) -> Dict[str, Any]:
+        header = self._inter.metadata.get(self._code)
+        if header is None:
+            header = await self._submit_metadata()
+        return header
+
+    async def __call__(self, *args: Any,
+                       kwargs: dict = {}) -> 'AsyncRObject':
+        code, segments = self._make_call(args, kwargs)
+        variable = self._inter.make_remote_variable()
+        await self._inter.get(f'{variable.name} <- {code}')
+        result = AsyncRObject(name=code, code=variable.name,
+                              interpreter=self._inter)
+        result._segments = segments + [variable]
+        return result
+
+    def __getitem__(self, name: Union[int, str]) -> 'AsyncRObject':
+        '''
+        It does not ask whether it is list or not before indexing.
+        '.ninter$item' in R does it instead.
+        '''
+        if isinstance(name, str):
+            code = f'.ninter$item({self._code}, "{name}")'
+        elif isinstance(name, int):
+            code = f'.ninter$item({self._code}, {int(name)})'
+        else:
+            raise BaseException('Slice or getting item could not work')
+        result = AsyncRObject(name=code, code=code, interpreter=self._inter)
+        result._segments = list(self._segments)
+        return result
+
+    def __setitem__(self, key: str, obj: Any) -> None:
+        self._inter.submit(self._make_setitem(key, obj))
+
+
+class AsyncDenoObject(DenoObject):
+    '''
+    DenoObject for AsyncInterpreter.
+    to_python, metadata and function call should be awaited.
+    '''
+
+    async def to_python(self) -> Any:
+        return await _to_python(self)
+
+    async def metadata(self) -> Dict[str, Any]:
+        header = self._inter.metadata.get(self._code)
+        if header is None:
+            header = await self._submit_metadata()
+        return header
+
+    async def __call__(self, *args: Any, **kwargs: Dict) -> 'AsyncDenoObject':
+        code, segments = self._make_call(args, kwargs)
+        variable = self._inter.make_remote_variable()
+        tmp_name = variable.name
+        await self._inter.get(
+            f'try{{{tmp_name} = {code};}}catch(er){{{tmp_name}=er}}')
+        result = AsyncDenoObject(name=code, code=tmp_name,
+                                 interpreter=self._inter)
+        result._segments = segments + [variable]
+        return result
+
+    def __getitem__(self, key: str) -> 'AsyncDenoObject':
+        code = f'{self._code}["{key}"]'
+        result = AsyncDenoObject(name=code, code=code,
+                                 interpreter=self._inter)
+        result._segments = list(self._segments)
+        return result
+
+    def __setitem__(self, key: str, obj: Any) -> None:
+        self._inter.submit(self._make_setitem(key, obj))
+
+
+class AsyncR(AsyncInterpreter):
+    def __init__(self) -> None:
+        super().__init__(RCommand(start=False), AsyncRObject)
+
+
+class AsyncDeno(AsyncInterpreter):
+    def __init__(self) -> None:
+        super().__init__(DenoCommand(start=False), AsyncDenoObject)
+
+
+class AsyncBridge(Bridge):
+    '''
+    Bridge of AsyncInterpreter.
+    Attributes are set without waiting.
+    '''
+
+    async def close(self) -> None:
+        await object.__getattribute__(self, '_inter').close()
+
+
+async def start_async_r() -> AsyncBridge:
+    return AsyncBridge(await AsyncR())
+
+
+async def start_async_deno() -> AsyncBridge:
+    return AsyncBridge(await AsyncDeno())
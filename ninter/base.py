@@ -1,13 +1,148 @@
 '''
 Base objects of ninter.
 '''
-from typing import Any, Optional, List, Union, Tuple, Callable, cast, Dict
+from typing import (Any, Optional, List, Union, Tuple, Callable, cast, Dict,
+                    Iterable, Iterator)
 from abc import abstractmethod
 from subprocess import Popen, PIPE, STDOUT
+import os
+import selectors
+import signal
 import time
 import uuid
-from collections import deque
+import re
+import threading
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from .expr import Compiled, Expr, Syntax
+from .memo import Memoized
+from .metrics import Metrics, type_label
 debug = False
+# Head of a frame of framed protocol.
+FRAME_HEAD = '\x02ninter '
+# Code which starts with it is a request of other operation than eval
+# to RPC servers.
+OPERATION_HEAD = '\x01'
+# Line printed between values fetched by Interpreter.fetch.
+FETCH_SEPARATOR = '\x1e\n'
+# Size of a chunk to read from the pipe.
+CHUNK_SIZE = 1 << 16
+# Lines which are echo of input.
+INPUT_LINE = re.compile(r'^>[^\n]*(?:\n|$)', re.MULTILINE)
+
+
+class ChunkReader:
+    '''
+    Reader of a pipe which reads big chunks by os.read.
+    Chunks are kept in a bytearray and a response is cut out of it
+    by searching the terminator in bytes.
+    And so, it is decoded only once per response.
+    The bytearray is shrunk after a big response
+    not to keep the memory.
+    '''
+
+    def __init__(self, fd: int, chunk_size: int = CHUNK_SIZE) -> None:
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        # Start of data which is not read yet.
+        self.pos = 0
+        # Seconds blocked on the pipe and bytes read.
+        # They are counted only if timed is True.
+        self.timed = False
+        self.waited = 0.0
+        self.received = 0
+        # Monotonic time to give up waiting for data.
+        # None means forever. See Interpreter.timeout.
+        self.deadline: Optional[float] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+
+    def _wait_readable(self) -> None:
+        '''
+        Wait until the pipe is readable or the deadline.
+        Data in the buffer is kept when it timed out,
+        and so, reading can be resumed.
+        '''
+        if self._selector is None:
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.fd, selectors.EVENT_READ)
+        timeout = cast(float, self.deadline) - time.monotonic()
+        if timeout <= 0 or not self._selector.select(timeout):
+            raise InterpreterTimeout('Timed out waiting for the interpreter.')
+
+    def _fill(self) -> bool:
+        '''
+        Read a chunk. It returns False at EOF.
+        '''
+        start = time.perf_counter() if self.timed else 0.0
+        if self.deadline is not None:
+            self._wait_readable()
+        data = os.read(self.fd, self.chunk_size)
+        if self.timed:
+            self.waited += time.perf_counter() - start
+            self.received += len(data)
+        if not data:
+            return False
+        if self.pos:
+            del self.buffer[:self.pos]
+            self.pos = 0
+        self.buffer += data
+        return True
+
+    def _take(self, end: int, skip: int = 0) -> bytes:
+        result = bytes(self.buffer[self.pos:end])
+        self.pos = end + skip
+        if self.pos == len(self.buffer) and len(self.buffer) > self.chunk_size:
+            self.buffer = bytearray()
+            self.pos = 0
+        return result
+
+    def readline(self) -> bytes:
+        '''
+        Read a line including new line.
+        At EOF, rest of data is returned and it may be empty.
+        '''
+        start = self.pos
+        while True:
+            end = self.buffer.find(b'\n', start)
+            if end != -1:
+                return self._take(end + 1)
+            start = len(self.buffer) - self.pos
+            if not self._fill():
+                return self._take(len(self.buffer))
+            start += self.pos
+
+    def read(self, size: int) -> bytes:
+        '''
+        Read exactly size bytes if it is not EOF.
+        '''
+        while len(self.buffer) - self.pos < size:
+            if not self._fill():
+                break
+        return self._take(min(self.pos + size, len(self.buffer)))
+
+    def read_until(self, line: bytes) -> Optional[bytes]:
+        '''
+        Read until the line and return data before it.
+        The line itself is removed.
+        It returns None at EOF.
+        '''
+        target = b'\n' + line
+        start = self.pos
+        while True:
+            # Data starts at head of a line.
+            if self.buffer.startswith(line, self.pos):
+                return self._take(self.pos, len(line))
+            index = self.buffer.find(target, start)
+            if index != -1:
+                return self._take(index + 1, len(line))
+            # The target may be across the chunks.
+            start = max(self.pos, len(self.buffer) - len(target)) - self.pos
+            if not self._fill():
+                return None
+            start += self.pos
+
 
 class Command:
     '''
@@ -21,29 +156,144 @@ class Command:
     - is_not_input_head
     '''
 
+    # Command line to start the interpreter.
+    args: List[str] = []
+    # Whether it uses framed protocol or not.
+    framed = False
+    # Set by Interpreter.instrument.
+    metrics: Optional[Metrics] = None
+
     def __init__(self) -> None:
         self.inter: Popen
+        self.reader: ChunkReader
+
+    def start(self, bootstrap: str = '') -> None:
+        '''
+        Start the interpreter and wait until it is ready.
+        Bootstrap code, for example library() calls, is run before it.
+        '''
+        self.spawn()
+        self.write(self.make_setup())
+        if bootstrap:
+            self.write(self.make_code(bootstrap))
+        to_send, to_get = self.make_key_pair(
+            str(uuid.uuid1()).replace('-', '_'))
+        self.write(to_send)
+        self.flush()
+        self.read_until(to_get)
+
+    def spawn(self) -> None:
+        '''
+        Start the process of the interpreter.
+        '''
+        self.inter = Popen(self.args, stdin=PIPE, stdout=PIPE, stderr=STDOUT,
+                           env=self.make_env())
+        self.reader = ChunkReader(self.inter.stdout.fileno())
+
+    def make_env(self) -> Optional[Dict[str, str]]:
+        '''
+        Environment variables of the interpreter.
+        None means the same as python.
+        '''
+        return None
+
+    def make_setup(self) -> str:
+        '''
+        Code to send when the interpreter started.
+        '''
+        return ''
 
     def close(self) -> None:
         self.inter.terminate()
 
+    def make_close_code(self) -> str:
+        '''
+        Code sent by Interpreter.close to quit the interpreter.
+        '''
+        return ';' + self.close() + ';\n'
+
+    def interrupt(self) -> bool:
+        '''
+        Interrupt the running computation by SIGINT.
+        It returns False if the interpreter can not be interrupted,
+        and then, it is killed.
+        '''
+        self.inter.send_signal(signal.SIGINT)
+        return True
+
     def write(self, text: str) -> None:
         '''
         Wrapper to write text.
         '''
         if debug:
             print('write', text)
-        self.inter.stdin.write(text.encode())
+        data = text.encode()
+        if self.metrics is not None:
+            self.metrics.count('ninter_bytes_out_total', len(data))
+        try:
+            self.inter.stdin.write(data)
+        except BrokenPipeError:
+            raise InterpreterClosed('Interpreter was closed.') from None
 
     def readline(self) -> str:
         '''
         Wrapper to read line.
         '''
-        result = self.inter.stdout.readline().decode()
+        result = self.reader.readline().decode()
+        if debug:
+            print('got', result)
+        return result
+
+    def read(self, size: int) -> str:
+        '''
+        Wrapper to read exactly size bytes.
+        '''
+        result = self.reader.read(size).decode()
         if debug:
             print('got', result)
         return result
 
+    def read_until(self, line: str) -> str:
+        '''
+        Read output until the line, and remove echo of input from it.
+        '''
+        data = self.reader.read_until(line.encode())
+        if data is None:
+            raise InterpreterClosed('Interpreter was closed.')
+        result = self.filter_output(data.decode())
+        if debug:
+            print('got', result)
+        return result
+
+    def read_frame(self) -> Tuple[str, str, str]:
+        '''
+        Read a frame of framed protocol and return key, status and body.
+        Lines out of frames, for example echo of input, are skipped.
+        '''
+        while True:
+            line = self.readline()
+            if not line:
+                raise InterpreterClosed('Interpreter was closed.')
+            if line.startswith(FRAME_HEAD):
+                key, status, size = line[len(FRAME_HEAD):].split()
+                # The body is coming, and it is read without deadline
+                # not to lose the head.
+                deadline, self.reader.deadline = self.reader.deadline, None
+                try:
+                    return key, status, self.read(int(size))
+                finally:
+                    self.reader.deadline = deadline
+
+    def filter_output(self, text: str) -> str:
+        '''
+        Remove lines which is_not_input_head judged to be ignored.
+        If it is not overwritten, it is done by a regex at once.
+        '''
+        if type(self).is_not_input_head is Command.is_not_input_head:
+            return INPUT_LINE.sub('', text)
+        return ''.join(line for line in text.splitlines(True)
+                       if self.is_not_input_head(line))
+
     def make_stamp(self, time_stamp: str) -> str:
         '''
         Make stamp code to talk with other language.
@@ -60,11 +310,33 @@ class Command:
         '''
         return f'Python_tmp_object_{time_stamp}'
 
+    def make_delete_command(self, names: List[str]) -> str:
+        '''
+        Make code to delete tmp variables.
+        If it returns empty string, they are not deleted.
+        '''
+        return ''
+
+    def make_update_command(self, assignments: List[Tuple[str, str]]) -> str:
+        '''
+        Make one statement to assign codes to names.
+        '''
+        return '; '.join(self.make_send_command(name, value)
+                         for name, value in assignments)
+
     def flush(self) -> None:
         '''
         Just a wrapper of flush of stdin for other interpreter.
+        Writing to the pipe happens here, and so, it is timed as write.
         '''
-        self.inter.stdin.flush()
+        try:
+            if self.metrics is None:
+                self.inter.stdin.flush()
+                return
+            with self.metrics.timer('ninter_write_seconds'):
+                self.inter.stdin.flush()
+        except BrokenPipeError:
+            raise InterpreterClosed('Interpreter was closed.') from None
 
     def is_not_input_head(self, text: str) -> bool:
         '''
@@ -92,6 +364,17 @@ class Command:
         '''
         return code
 
+    def make_frame_code(self, code: str, key: str) -> str:
+        '''
+        Make code for framed protocol.
+        The interpreter should print the output of the code
+        after a header line like below.
+        f'{FRAME_HEAD}{key} {status} {byte_length}'
+        The status is 'ok' or 'error'.
+        It needs to be overwritten to use framed protocol.
+        '''
+        raise NotImplementedError('Framed protocol is not supported.')
+
     @abstractmethod
     def make_key_pair(self, key: str) -> Tuple[str, str]:
         '''
@@ -137,6 +420,70 @@ class Command:
         return ''
 
 
+class ServerCommand(Command):
+    '''
+    Base of commands which run RPC server script instead of REPL.
+    Requests are frames of operations like eval, get, set, call and delete,
+    and so, there is no echo to skip.
+    Code which starts with OPERATION_HEAD and name of the operation
+    is sent as the operation, and other code is sent by eval.
+    It always uses framed protocol.
+    Inherit it before the command of the language.
+    '''
+
+    def __init__(self, start: bool = True, framed: bool = True) -> None:
+        self.framed = True
+        if start:
+            self.start()
+
+    def start(self, bootstrap: str = '') -> None:
+        self.spawn()
+        last = 'setup'
+        self.write(self.make_frame_code(self.make_setup(), last))
+        if bootstrap:
+            last = 'bootstrap'
+            self.write(self.make_frame_code(bootstrap, last))
+        self.flush()
+        while self.read_frame()[0] != last:
+            pass
+
+    def make_frame_code(self, code: str, key: str) -> str:
+        operation = 'eval'
+        if code.startswith(OPERATION_HEAD):
+            operation, _, code = code[1:].partition(' ')
+        return f'{FRAME_HEAD}{key} {operation} {len(code.encode())}\n{code}'
+
+    def make_send_command(self, name: str, value: str) -> str:
+        return f'{OPERATION_HEAD}set {name}\n{value}'
+
+    def make_let_command(self, name: str, value: str) -> str:
+        return self.make_send_command(name, value)
+
+    def make_delete_command(self, names: List[str]) -> str:
+        return f'{OPERATION_HEAD}delete ' + ' '.join(names)
+
+    def make_call_command(self, name: str, code: str) -> str:
+        return f'{OPERATION_HEAD}call {name}\n{code}'
+
+
+class RemoteVariable:
+    '''
+    A tmp variable in other interpreter.
+    Objects which use it keep reference of it like segments.
+    When all of them were collected, the name is queued
+    and it is deleted with other names at once.
+    '''
+
+    def __init__(self, interpreter: Any, name: str) -> None:
+        self.name = name
+        with interpreter._gc_lock:
+            interpreter.live_objects += 1
+        self._finalizer = weakref.finalize(
+            self, interpreter._queue_delete, name)
+        # Nothing to delete if python is exiting.
+        self._finalizer.atexit = False
+
+
 class InterpreterException(Exception):
     '''
     Exception class which should be raised
@@ -151,6 +498,135 @@ class InterpreterException(Exception):
         return f'\n\nInterpreter-Exception: {ex_str}'
 
 
+class InterpreterClosed(InterpreterException):
+    '''
+    Exception raised when the interpreter was closed or crashed.
+    '''
+
+
+class InterpreterTimeout(InterpreterException, TimeoutError):
+    '''
+    Exception raised when a response did not come until the deadline.
+    '''
+
+
+class MetadataCache:
+    '''
+    Cache of metadata of objects in other interpreter,
+    for example, class, type, names and length.
+    Keys are names of InterpreterObject.
+    It is filled by the first probe of each object
+    and invalidated when the name was reassigned by python.
+    Code sent by Interpreter.send is not tracked.
+    If such code reassigns something, call clear.
+    It keeps maxsize entries and the least recently used one is dropped.
+    It may be used by some threads in thread safe mode.
+    '''
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.data: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self.data.get(name)
+            if result is None:
+                self.misses += 1
+            else:
+                self.data.move_to_end(name)
+                self.hits += 1
+            return result
+
+    def set(self, name: str, metadata: Dict[str, Any]) -> None:
+        with self._lock:
+            self.data[name] = metadata
+            self.data.move_to_end(name)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, name: str) -> None:
+        '''
+        Remove metadata of the name and codes which use it,
+        for example, 'x$a', 'x.length', 'names(x)' or '(x + 1)' for 'x'.
+        'xy' is not removed because x is not a whole identifier in it.
+        '''
+        pattern = re.compile(rf'(?<!\w){re.escape(name)}(?!\w)')
+        with self._lock:
+            self.data.pop(name, None)
+            for key in [key for key in self.data
+                        if name in key and pattern.search(key)]:
+                del self.data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.data.clear()
+
+
+class Future:
+    '''
+    Result of a command which was sent but may not be received yet.
+    It is made by Interpreter.submit.
+    The response is converted as soon as it was received.
+    '''
+
+    def __init__(self, interpreter: Optional['Interpreter'],
+                 key: Optional[str],
+                 convert: Optional[Callable[[str], Any]] = None) -> None:
+        self._inter = interpreter
+        self.key = key
+        self._convert = convert
+        self._done = False
+        self._value: Any = None
+        self._error: Optional[BaseException] = None
+        # Text received by the reader thread and not converted yet.
+        self._text: Optional[str] = None
+
+    @classmethod
+    def completed(cls, value: Any) -> 'Future':
+        '''
+        Make a future which needs no round trip.
+        '''
+        future = cls(None, None)
+        future._done = True
+        future._value = value
+        return future
+
+    def set_text(self, text: str) -> None:
+        '''
+        Called by Interpreter when the response was received.
+        '''
+        metrics = self._inter.metrics if self._inter is not None else None
+        start = time.perf_counter() if metrics is not None else 0.0
+        try:
+            self._value = self._convert(text) if self._convert else text
+        except BaseException as er:
+            self._error = er
+        self._done = True
+        if metrics is not None:
+            metrics.observe('ninter_decode_seconds',
+                            time.perf_counter() - start)
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        '''
+        Wait for the response and return converted value.
+        If conversion was failed, the exception is raised.
+        timeout: float
+            Seconds to wait. Interpreter.timeout is used if it is None.
+        '''
+        if not self._done:
+            self._inter.flush()
+            self._inter._wait_future(self, timeout)
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
 class Interpreter:
     '''
     Wrapper of pipe between other interpreter and python.
@@ -165,81 +641,549 @@ class Interpreter:
         self.command = command
         self.key_q: deque = deque()
         self.q_num = 0
+        self.sent_num = 0
         self.ObjectClass = ObjectClass
+        self.metadata = MetadataCache()
+        self.futures: Dict[str, Future] = {}
+        self._batch_depth = 0
+        # Number of tmp variables which are not queued to delete.
+        self.live_objects = 0
+        # Names of tmp variables to delete.
+        self.garbage: List[str] = []
+        # Guards live_objects and garbage. Finalizers run in any thread
+        # and may run while this thread holds it.
+        self._gc_lock = threading.RLock()
+        # Instrumentation is off if it is None.
+        self.metrics: Optional[Metrics] = None
+        # Thread safe mode is on if the reader thread is running.
+        # See start_reader.
+        self._reader: Optional[threading.Thread] = None
+        self._write_lock = threading.RLock()
+        self._condition = threading.Condition()
+        # Responses which were received and not taken by threads yet.
+        self._responses: Dict[str, str] = {}
+        # Keys whose responses are thrown away.
+        self._ignored: set = set()
+        # Keys sent by each thread without futures.
+        self._thread_keys: Dict[int, deque] = {}
+        self._reader_error: Optional[BaseException] = None
+        # Key which the reader thread is reading.
+        self._reading: Optional[str] = None
+        # Seconds to wait for a response. None means forever.
+        # Methods which wait take timeout to override it.
+        self.timeout: Optional[float] = None
+
+    def instrument(self, metrics: Optional[Metrics] = None) -> Metrics:
+        '''
+        Turn on instrumentation and return the metrics.
+        Metrics may be shared by some interpreters.
+        '''
+        if metrics is None:
+            metrics = Metrics()
+        self.metrics = self.command.metrics = metrics
+        self.command.reader.timed = True
+        return metrics
+
+    def uninstrument(self) -> None:
+        self.metrics = self.command.metrics = None
+        self.command.reader.timed = False
+
+    def _count(self, operation: str) -> None:
+        if self.metrics is not None:
+            self.metrics.count('ninter_operations_total', operation=operation)
 
-    def send(self, code: str) -> str:
+    def _encode(self, value: Any, segments: List) -> str:
+        '''
+        Convert python object to code with instrumentation.
+        '''
+        if self.metrics is None:
+            return self.ObjectClass._convert_to_interpreter(value, segments)
+        self.metrics.count('ninter_conversions_total',
+                           direction='to_interpreter', type=type_label(value))
+        with self.metrics.timer('ninter_encode_seconds'):
+            return self.ObjectClass._convert_to_interpreter(value, segments)
+
+    # Tmp variables are deleted when this number of them were queued.
+    collect_threshold = 64
+    # Queued responses are received when this number of requests
+    # are in flight. Otherwise, pipes of both sides may be filled
+    # and both processes are blocked.
+    max_in_flight = 128
+    # Seconds to wait for the response of an interrupted computation.
+    resync_timeout = 5.0
+
+    def _queue_delete(self, name: str) -> None:
+        '''
+        Called when a RemoteVariable was collected.
+        It may be called in the middle of sending something,
+        and so, it just queues the name.
+        '''
+        with self._gc_lock:
+            self.live_objects -= 1
+            self.garbage.append(name)
+
+    def _make_collect_command(self) -> str:
+        with self._gc_lock:
+            names, self.garbage = self.garbage, []
+        if not names:
+            return ''
+        return self.command.make_delete_command(names)
+
+    def collect(self) -> int:
+        '''
+        Delete queued tmp variables now and wait for it.
+        It returns number of deleted variables.
+        '''
+        self._count('collect')
+        with self._gc_lock:
+            number = len(self.garbage)
+            code = self._make_collect_command()
+        if code:
+            self.get(code)
+        return number
+
+    def make_remote_variable(self) -> RemoteVariable:
+        '''
+        Make a tmp variable which is deleted
+        when objects using it were collected.
+        '''
+        return RemoteVariable(
+            self, self.make_tmp_variable(str(uuid.uuid1()).replace('-', '_')))
+
+    def send(self, code: str, future: Optional[Future] = None) -> str:
         '''
         Send something.
         After sending, flush should be done before receive.
         code: str
             code to send
+        future: Future
+            Future for the response. Its key is set.
         Returns
         ==========
         Key of the sended object. The type is string.
         '''
+        with self._write_lock:
+            if self._reader is None and self.q_num >= self.max_in_flight:
+                self._receive_queued()
+            if len(self.garbage) >= self.collect_threshold:
+                # The response is ignored by receive_by_key.
+                collect_code = self._make_collect_command()
+                if collect_code:
+                    self.send(collect_code)
+            self.sent_num += 1
+            # Counter makes keys unique even if time is same.
+            time_stamp = f'{time.time()}-{self.sent_num}'
+            if self.command.framed:
+                key = time_stamp
+                text = self.command.make_frame_code(code, key)
+            else:
+                key_to_send, key = self.command.make_key_pair(time_stamp)
+                text = self.command.make_code(code) + key_to_send
+            # The key is queued before writing,
+            # or the reader thread may miss the response.
+            if self._reader is None:
+                self._enqueue(key, future)
+            else:
+                with self._condition:
+                    self._enqueue(key, future)
+                    if future is None:
+                        self._thread_keys.setdefault(
+                            threading.get_ident(), deque()).append(key)
+                    self._condition.notify_all()
+            if self.metrics is not None:
+                self.metrics.count('ninter_requests_total')
+                self.metrics.gauge('ninter_queue_depth', self.q_num)
+            self.command.write(text)
+        return cast(str, key)
+
+    def _enqueue(self, key: str, future: Optional[Future]) -> None:
         self.q_num += 1
-        time_stamp = str(time.time())
-        self.command.write(self.command.make_code(code))
-        key_to_send, key = self.command.make_key_pair(time_stamp)
-        self.command.write(key_to_send)
         self.key_q.append(key)
-        return cast(str, key)
+        if future is not None:
+            future.key = key
+            self.futures[key] = future
 
     def flush(self) -> None:
         '''
         Wrapper to flush stdout.
         '''
-        self.command.flush()
+        with self._write_lock:
+            self.command.flush()
 
-    def receive_by_key(self, request_key: str) -> str:
+    def receive_by_key(self, request_key: str,
+                       timeout: Optional[float] = None) -> str:
         '''
         Receive str from interpreter until request key was catched.
-        It ignores any lines or keys until the key was catched.
+        It ignores any lines or keys until the key was catched,
+        except responses for futures.
+        In thread safe mode, it ignores only responses
+        which were sent before the key by the same thread.
+        If it timed out, InterpreterTimeout is raised. See _resync.
         '''
+        deadline = self._make_deadline(timeout)
+        if self._reader is not None:
+            return self._wait_response(request_key, deadline)
         while True:
-            key, value = self.receive_one()
+            if not self.q_num:
+                # For example, it was skipped after a timeout.
+                raise InterpreterException(
+                    f'No response is queued for {request_key}.')
+            key, value = self.receive_one(deadline)
+            future = self.futures.pop(key, None)
+            if future is not None:
+                future.set_text(value)
             if key == request_key:
                 return value
 
-    def get(self, name: str) -> str:
+    def _receive_queued(self) -> None:
+        '''
+        Flush and receive all of queued responses.
+        Responses which are not for futures are ignored
+        as receive_by_key does.
+        '''
+        self.flush()
+        while self.q_num:
+            key, value = self.receive_one()
+            future = self.futures.pop(key, None)
+            if future is not None:
+                future.set_text(value)
+
+    def start_reader(self) -> None:
+        '''
+        Turn on thread safe mode.
+        A reader thread receives all of responses and
+        routes them to futures or waiting threads by keys.
+        Writes are serialized by a lock.
+        Many threads can share the interpreter and pipeline requests.
+        Call it before other threads use the interpreter.
+        '''
+        if self._reader is not None:
+            return
+        # Responses before it are received in this thread.
+        self._receive_queued()
+        self._reader = threading.Thread(
+            target=self._read_loop, name='ninter-reader', daemon=True)
+        self._reader.start()
+
+    def _read_loop(self) -> None:
+        '''
+        Loop of the reader thread.
+        Conversion of responses of futures is done by waiting threads,
+        because converters may use the interpreter.
+        '''
+        condition = self._condition
+        while True:
+            with condition:
+                condition.wait_for(
+                    lambda: self.q_num or self._reader_error is not None)
+                if self._reader_error is not None:
+                    return
+                key = self._reading = self.key_q.popleft()
+                self.q_num -= 1
+            try:
+                value = self._read_response(key)
+            except BaseException as er:
+                with condition:
+                    self._reader_error = er
+                    condition.notify_all()
+                return
+            with condition:
+                self._reading = None
+                future = self.futures.pop(key, None)
+                if future is not None:
+                    future._text = value
+                elif key in self._ignored:
+                    self._ignored.remove(key)
+                else:
+                    self._responses[key] = value
+                condition.notify_all()
+            # The last future must not be kept alive while waiting,
+            # or objects used by its converter are not collected.
+            future = None
+    def _check_reader(self) -> None:
+        if self._reader_error is not None:
+            raise InterpreterClosed(
+                f'The reader thread was stopped: {self._reader_error!r}')
+
+    def _make_deadline(self, timeout: Optional[float]) -> Optional[float]:
+        if timeout is None:
+            timeout = self.timeout
+        return None if timeout is None else time.monotonic() + timeout
+
+    def _wait_response(self, key: str, deadline: Optional[float]) -> str:
+        ident = threading.get_ident()
+        with self._condition:
+            keys = self._thread_keys.get(ident)
+            while keys:
+                old_key = keys.popleft()
+                if old_key == key:
+                    break
+                if self._responses.pop(old_key, None) is None:
+                    self._ignored.add(old_key)
+            if not keys:
+                self._thread_keys.pop(ident, None)
+            if not self._condition.wait_for(
+                    lambda: key in self._responses
+                    or self._reader_error is not None,
+                    self._remaining(deadline)):
+                self._abandon(key)
+            if key not in self._responses:
+                self._check_reader()
+            return self._responses.pop(key)
+
+    def _wait_future(self, future: Future,
+                     timeout: Optional[float] = None) -> None:
+        '''
+        Wait until the response of the future was received.
+        '''
+        if self._reader is None:
+            self.receive_by_key(cast(str, future.key), timeout)
+            return
+        deadline = self._make_deadline(timeout)
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: future._text is not None or future._done
+                    or self._reader_error is not None,
+                    self._remaining(deadline)):
+                self.futures.pop(cast(str, future.key), None)
+                self._abandon(cast(str, future.key))
+            text, future._text = future._text, None
+        if text is not None:
+            # Conversion is done out of the lock
+            # and other threads waiting for the future are woken after it.
+            future.set_text(text)
+            with self._condition:
+                self._condition.notify_all()
+        elif not future._done:
+            self._check_reader()
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(
+            0.0, deadline - time.monotonic())
+
+    def _abandon(self, key: str) -> None:
+        '''
+        Give up a response in thread safe mode.
+        It is called with the condition.
+        The computation is interrupted only if it is running,
+        and the response is thrown away by the reader thread.
+        '''
+        self._count('timeout')
+        self._ignored.add(key)
+        if self._reading == key and not self.command.interrupt():
+            self.command.inter.kill()
+        raise InterpreterTimeout(f'Timed out waiting for {key}.')
+
+    def submit(self, code: Union[str, 'InterpreterObject'],
+               convert: Optional[Callable[[str], Any]] = None) -> Future:
+        '''
+        Send something and return Future without waiting.
+        If code is InterpreterObject, the future is for its to_python.
+        In batch, flush is done at the end of batch.
+
+        code: str or InterpreterObject
+            Code to send.
+        convert: Callable
+            Function to convert the received string.
+        ====================
+        Returns Future
+        '''
+        if isinstance(code, InterpreterObject):
+            self._count('to_python')
+            return code._submit()
+        self._count('submit')
+        future = Future(self, None, convert)
+        self.send(code, future)
+        if not self._batch_depth:
+            self.flush()
+        return future
+
+    @contextmanager
+    def batch(self) -> Iterator['Interpreter']:
+        '''
+        Context manager to pipeline many commands.
+        Commands submitted in it are flushed once at the end,
+        and all of responses are received in one pass.
+
+        >>> with r.batch() as batch:
+        ...     futures = [batch.submit(r[name]) for name in names]
+        >>> values = [future.result() for future in futures]
+        '''
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+                self.drain()
+
+    def drain(self) -> None:
+        '''
+        Receive all of responses for futures.
+        '''
+        if self._reader is not None:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: not self.futures
+                    or self._reader_error is not None)
+            return
+        while self.futures and self.q_num:
+            key, value = self.receive_one()
+            future = self.futures.pop(key, None)
+            if future is not None:
+                future.set_text(value)
+
+    def get(self, name: str, timeout: Optional[float] = None) -> str:
         '''
         Get output from interpreter.
+        timeout: float
+            Seconds to wait. self.timeout is used if it is None.
         '''
+        self._count('get')
         key = self.send(name)
         self.flush()
-        return self.receive_by_key(key)
+        return self.receive_by_key(key, timeout)
 
-    def receive_one(self) -> Tuple[str, str]:
+    def receive_one(self, deadline: Optional[float] = None
+                    ) -> Tuple[str, str]:
         '''
         Receive method to get one string with key.
         '''
         if self.q_num == 0:
             return '', ''
-        strings: List[str] = []
         key = self.key_q.popleft()
-        while True:
-            tmp = self.command.readline()
-            if tmp == key:
-                break
-            if self.command.is_not_input_head(tmp):
-                strings.append(tmp)
         self.q_num -= 1
-        result = ''.join(strings)
-        return key, result
+        return key, self._read_response(key, deadline)
+
+    def _read_response(self, key: str,
+                       deadline: Optional[float] = None) -> str:
+        metrics = self.metrics
+        if metrics is not None:
+            reader = self.command.reader
+            start = time.perf_counter()
+            waited, received = reader.waited, reader.received
+        if deadline is None:
+            result = self._read_raw(key)
+        else:
+            self.command.reader.deadline = deadline
+            try:
+                result = self._read_raw(key)
+            except InterpreterTimeout as er:
+                self.command.reader.deadline = None
+                self._resync(key)
+                # The response was skipped and the future never gets it.
+                future = self.futures.pop(key, None)
+                if future is not None:
+                    future._error = er
+                    future._done = True
+                raise
+            finally:
+                self.command.reader.deadline = None
+        if metrics is not None:
+            wait = reader.waited - waited
+            metrics.observe('ninter_wait_seconds', wait)
+            metrics.observe('ninter_read_seconds',
+                            time.perf_counter() - start - wait)
+            metrics.count('ninter_bytes_in_total', reader.received - received)
+        return result
+
+    def _read_raw(self, key: str) -> str:
+        if self.command.framed:
+            return self._receive_frame(key)
+        return self.command.read_until(key)
+
+    def _resync(self, key: str) -> None:
+        '''
+        Called when reading the response of the key timed out.
+        The computation is interrupted and the response is skipped,
+        and so, the interpreter is usable after it.
+        If it can not be interrupted or it does not answer
+        in resync_timeout seconds, it is killed
+        and later calls raise InterpreterClosed.
+        '''
+        self._count('timeout')
+        reader = self.command.reader
+        if self.command.interrupt():
+            reader.deadline = time.monotonic() + self.resync_timeout
+            try:
+                self._read_raw(key)
+                return
+            except (InterpreterTimeout, InterpreterClosed):
+                pass
+            finally:
+                reader.deadline = None
+        self.command.inter.kill()
+        self.command.inter.wait()
+
+    def _receive_frame(self, key: str) -> str:
+        '''
+        Receive a frame of framed protocol.
+        Error message is in the frame, too, and it is returned as it is.
+        '''
+        while True:
+            frame_key, status, body = self.command.read_frame()
+            if frame_key == key:
+                return body
+
+    def _encode_value(self, value: Any, segments: List) -> str:
+        '''
+        Code of a value to set.
+        Objects of other interpreters are converted through python.
+        '''
+        if isinstance(value, self.ObjectClass):
+            return value._code
+        elif isinstance(value, InterpreterObject):
+            return self._encode(value.to_python(), segments)
+        return self._encode(value, segments)
 
     def _setitem(self, name: str, value, make_command: Callable) -> None:
         if debug:
             print('code:', make_command(name, value))
-        if isinstance(value, self.ObjectClass):
-            self.get(make_command(name, value.name))
-        elif isinstance(value, InterpreterObject):
-            self.get(make_command(
-                name,
-                self.ObjectClass._convert_to_interpreter(value.to_python())))
-        else:
-            self.get(make_command(
-                name,
-                self.ObjectClass._convert_to_interpreter(value)))
+        self._count('set')
+        self.metadata.invalidate(name)
+        # Segments are released after the interpreter read them.
+        segments: List = []
+        self.get(make_command(name, self._encode_value(value, segments)))
+        for segment in segments:
+            segment.release()
+
+    def update(self, mapping: Dict[str, Any]) -> None:
+        '''
+        Set many objects in one statement and one round trip.
+        It is same as __setitem__ of each item.
+
+        >>> r.update({'x': [1, 2, 3], 'y': 'hello'})
+        '''
+        self._count('update')
+        segments: List = []
+        assignments = []
+        for name, value in mapping.items():
+            self.metadata.invalidate(name)
+            assignments.append((name, self._encode_value(value, segments)))
+        if assignments:
+            self.get(self.command.make_update_command(assignments))
+        for segment in segments:
+            segment.release()
+
+    def fetch(self, names: Iterable[str],
+              timeout: Optional[float] = None) -> Dict[str, Any]:
+        '''
+        Get many objects as python values in one statement
+        and one round trip.
+        Values are same as to_python of each item.
+
+        >>> r.fetch(['x', 'y'])
+        {'x': [1, 2, 3], 'y': 'hello'}
+        '''
+        self._count('fetch')
+        names = list(names)
+        if not names:
+            return {}
+        objects = [self[name] for name in names]
+        values = self.ObjectClass._submit_many(self, objects).result(timeout)
+        return dict(zip(names, values))
 
     def __setitem__(self, name: str, value: Any) -> None:
         '''
@@ -271,9 +1215,19 @@ class Interpreter:
         self._setitem(name, value, self.command.make_const_command)
 
     def close(self) -> None:
-        self.send(';' + self.command.close() + ';\n')
-        self.flush()
+        try:
+            self.send(self.command.make_close_code())
+            self.flush()
+        except InterpreterClosed:
+            # It was killed or crashed already.
+            pass
         self.command.inter.wait()
+        if self._reader is not None:
+            with self._condition:
+                if self._reader_error is None:
+                    self._reader_error = InterpreterClosed('closed')
+                self._condition.notify_all()
+            self._reader.join()
         self.command.close()
 
 
@@ -282,6 +1236,12 @@ class InterpreterObject:
     ABC to make object from other interpreter
     perform like python object.
     '''
+    # Results of operators are lazy.
+    # They have a graph instead of code and it is compiled when it is used.
+    _lazy: Optional[Expr] = None
+    _syntax = Syntax()
+    _name = Compiled()
+    _code = Compiled()
 
     def __init__(self, name: str, interpreter: Interpreter,
                  code: Optional[str] = None,
@@ -295,10 +1255,14 @@ class InterpreterObject:
 
     @classmethod
     @abstractmethod
-    def _convert_to_interpreter(cls, obj: Any) -> str:
+    def _convert_to_interpreter(cls, obj: Any,
+                                segments: Optional[List] = None) -> str:
         '''
         Class method to make some python object
         to be a string to send to interpreter.
+        Big objects may be passed by segments of shared memory.
+        Made segments are appended to 'segments' and
+        they should be kept until the interpreter read them.
         '''
         return ''
 
@@ -313,6 +1277,107 @@ class InterpreterObject:
         '''
         pass
 
+    def _submit(self) -> Future:
+        '''
+        Future of to_python.
+        Override it to pipeline to_python by Interpreter.submit.
+        '''
+        return Future.completed(self.to_python())
+
+    def iter_chunks(self, rows: int = 100000,
+                    prefetch: int = 1) -> Iterator[Any]:
+        '''
+        Iterate over the object by slices of rows.
+        Only slices are sent, and so, the object in the interpreter
+        is not copied and memory of python stays flat.
+        Requests of next slices are pipelined and the interpreter
+        makes them while python processes the current one.
+
+        rows: int
+            Number of rows (or elements of vector) of a slice.
+        prefetch: int
+            Number of slices requested before they are needed.
+
+        >>> for frame in r['big_frame'].iter_chunks(rows=1000000):
+        ...     total += frame['x'].sum()
+        '''
+        if rows < 1:
+            raise ValueError('rows should be positive.')
+        total = self._count_rows()
+        pending: deque = deque()
+        start = 0
+        while start < total or pending:
+            while start < total and len(pending) <= prefetch:
+                stop = min(start + rows, total)
+                pending.append(self._submit_chunk(start, stop))
+                start = stop
+            yield pending.popleft().result()
+
+    def memoize(self, maxsize: int = 128, ttl: Optional[float] = None,
+                to_python: bool = False,
+                max_bytes: Optional[int] = None) -> Memoized:
+        '''
+        Cache results of calls of this function.
+        Calls with same arguments return the cached result
+        without running the function again.
+        See ninter.memo.
+
+        >>> t_test = r['t.test'].memoize(maxsize=256, ttl=600)
+        '''
+        return Memoized(self, maxsize, ttl, to_python, max_bytes)
+
+    def _count_rows(self) -> int:
+        '''
+        Number of rows for iter_chunks.
+        '''
+        raise NotImplementedError('iter_chunks is not supported.')
+
+    def _submit_chunk(self, start: int, stop: int) -> Future:
+        '''
+        Future of rows from start to stop (not included).
+        '''
+        raise NotImplementedError('iter_chunks is not supported.')
+
+    @classmethod
+    def _submit_many(cls, interpreter: Interpreter,
+                     objects: List['InterpreterObject']) -> Future:
+        '''
+        Future of list of values of objects for Interpreter.fetch.
+        Outputs of the values are separated by FETCH_SEPARATOR
+        and each of them is converted by _convert of the object.
+        '''
+        code, buffer_paths = cls._make_fetch_many(interpreter, objects)
+
+        def convert(value: str) -> List[Any]:
+            texts = value.split(FETCH_SEPARATOR)
+            # Output after the last separator is not a value.
+            if len(texts) != len(objects) + 1:
+                raise InterpreterException(
+                    f'{len(objects)} values were expected '
+                    f'but {len(texts) - 1} were got.\n{value}')
+            return [obj._convert(text, buffer_path)
+                    for obj, text, buffer_path
+                    in zip(objects, texts, buffer_paths)]
+        return interpreter.submit(code, convert)
+
+    @classmethod
+    def _make_fetch_many(cls, interpreter: Interpreter,
+                         objects: List['InterpreterObject']
+                         ) -> Tuple[str, List[str]]:
+        '''
+        Code to fetch the objects and paths of their segments.
+        '''
+        raise NotImplementedError('fetch is not supported.')
+
+    @abstractmethod
+    def metadata(self) -> Dict[str, Any]:
+        '''
+        Metadata of the object like class, type, names and length.
+        It is cached in Interpreter.metadata
+        and only the first call needs round trip.
+        '''
+        pass
+
     @abstractmethod
     def __del__(self) -> Any:
         '''
@@ -328,15 +1393,46 @@ class InterpreterObject:
         '''
         return True
 
+    def _count_conversion(self, path: str) -> None:
+        '''
+        Count conversion path of response if it is instrumented.
+        '''
+        metrics = self._inter.metrics
+        if metrics is not None:
+            metrics.count('ninter_conversions_total',
+                          direction='to_python', type=path)
+
+    @property
+    def _expr(self) -> Expr:
+        '''
+        Node of this object in graph of lazy expression.
+        '''
+        return self._lazy if self._lazy is not None else Expr.leaf(self._code)
+
+    def _make_lazy(self, node: Expr, segments: List) -> 'InterpreterObject':
+        '''
+        Make lazy object of the node.
+        Segments of operands are kept by it.
+        '''
+        result = self.__class__(name=None, interpreter=self._inter)
+        result._lazy = node
+        result._segments = segments
+        return result
+
     def _operator(self, obj: Any, operator: str) -> 'InterpreterObject':
-        if not isinstance(obj, InterpreterObject):
-            obj = self.__class__._convert_to_interpreter(obj)
-        code = f'({self._code} {operator} {obj})'
-        time_stamp = str(uuid.uuid1()).replace('-', '_')
-        tmp_name = self._inter.make_tmp_variable(time_stamp)
-        self._inter.send(f'try{{{tmp_name} = {code};}}catch(er){{{tmp_name}=er}}')
-        self._inter.flush()
-        return self.__class__(name=code, code=tmp_name, interpreter=self._inter)
+        '''
+        Operators are not evaluated here.
+        They are recorded and evaluated at once by to_python.
+        '''
+        segments = list(self._segments)
+        if isinstance(obj, self.__class__):
+            other = obj._expr
+            segments.extend(obj._segments)
+        else:
+            other = Expr.leaf(
+                self.__class__._convert_to_interpreter(obj, segments))
+        return self._make_lazy(
+            Expr('operator', operator, (self._expr, other)), segments)
 
     def __iadd__(self, obj: Any) -> 'InterpreterObject':
         return self._operator(obj, '+')
@@ -359,6 +1455,9 @@ class InterpreterObject:
     def __div__(self, obj: Any) -> 'InterpreterObject':
         return self._operator(obj, '/')
 
+    def __truediv__(self, obj: Any) -> 'InterpreterObject':
+        return self._operator(obj, '/')
+
     def __idiv__(self, obj: Any) -> 'InterpreterObject':
         return self._operator(obj, '/')
 
@@ -413,6 +1512,21 @@ class Bridge:
     def __setitem__(self, key: str, obj: Any) -> None:
         self._inter[key] = obj
 
+    def update(self, mapping: Dict[str, Any]) -> None:
+        '''
+        Same as Interpreter.update.
+        Remote 'update' is got by bridge['update'].
+        '''
+        object.__getattribute__(self, '_inter').update(mapping)
+
+    def fetch(self, names: Iterable[str],
+              timeout: Optional[float] = None) -> Dict[str, Any]:
+        '''
+        Same as Interpreter.fetch.
+        Remote 'fetch' is got by bridge['fetch'].
+        '''
+        return object.__getattribute__(self, '_inter').fetch(names, timeout)
+
     def close(self):
         object.__getattribute__(self, '_inter').close()
 
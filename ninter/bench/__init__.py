@@ -0,0 +1,207 @@
+'''
+Benchmarks of ninter.
+It measures what the hot paths cost, for example,
+round trip of Interpreter.get, to_python, function calls,
+transfer of vectors and data frames, and starting interpreters.
+Results are percentiles of seconds and they are written as JSON,
+and so, results of releases can be compared.
+
+$ python -m ninter.bench --interpreters deno --output bench.json
+$ python -m ninter.bench --compare bench.json
+'''
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import platform
+import shutil
+import time
+
+# Sizes of payloads.
+SIZES = [1, 1000, 100000, 10000000]
+PERCENTILES = [50, 90, 99]
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    '''
+    Percentile with linear interpolation.
+    Samples should be sorted.
+    '''
+    position = (len(samples) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (
+        position - lower)
+
+
+def measure(function: Callable[[], Any], repeat: int,
+            warmup: int = 1) -> Dict[str, float]:
+    '''
+    Run the function and summarize seconds it took.
+    '''
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    result = {f'p{percent}': percentile(samples, percent)
+              for percent in PERCENTILES}
+    result.update(n=repeat, min=samples[0], max=samples[-1],
+                  mean=sum(samples) / repeat)
+    return result
+
+
+class Target:
+    '''
+    Code of an interpreter used by benchmarks.
+    '''
+    name = ''
+    executable = ''
+    max_code = ''
+    scalar_code = ''
+
+    def start(self) -> Any:
+        pass
+
+    def declare(self, inter: Any, name: str) -> None:
+        '''
+        Make the variable assignable by inter[name] = value.
+        '''
+        pass
+
+    def vector(self, size: int) -> Any:
+        return [float(i) for i in range(size)]
+
+    def frame(self, size: int) -> Any:
+        import pandas as pd
+        return pd.DataFrame({'x': [float(i) for i in range(size)],
+                             'n': list(range(size)),
+                             's': [str(i % 10) for i in range(size)]})
+
+    def available(self) -> bool:
+        return shutil.which(self.executable) is not None
+
+
+class RTarget(Target):
+    name = 'r'
+    executable = 'R'
+    max_code = 'max'
+    scalar_code = '1'
+
+    def start(self) -> Any:
+        from ..interpreter import R
+        return R()
+
+
+class DenoTarget(Target):
+    name = 'deno'
+    executable = 'deno'
+    max_code = 'Math.max'
+    scalar_code = 'console.log(1)'
+
+    def start(self) -> Any:
+        from ..interpreter import Deno
+        return Deno()
+
+    def declare(self, inter: Any, name: str) -> None:
+        '''
+        Deno cannot assign undeclared variable.
+        '''
+        inter.let(name, 0)
+
+
+TARGETS: Dict[str, Target] = {'r': RTarget(), 'deno': DenoTarget()}
+
+
+def repeat_for(size: int, repeat: int) -> int:
+    '''
+    Big payloads are measured fewer times.
+    '''
+    return max(3, min(repeat, 10 ** 7 // max(size, 1)))
+
+
+def run_target(target: Target, sizes: List[int],
+               repeat: int) -> Iterator[Dict[str, Any]]:
+    def result(name: str, size: int, summary: Dict[str, float]
+               ) -> Dict[str, Any]:
+        summary = dict(interpreter=target.name, name=name,
+                       size=size, **summary)
+        summary['per_second'] = size / summary['p50']
+        return summary
+
+    yield result('startup', 1, measure(
+        lambda: target.start().close(), min(repeat, 5)))
+    inter = target.start()
+    try:
+        yield result('get', 1, measure(
+            lambda: inter.get(target.scalar_code), repeat))
+        target.declare(inter, 'bench_value')
+        inter['bench_value'] = 1
+        yield result('to_python', 1, measure(
+            lambda: inter['bench_value'].to_python(), repeat))
+        function = inter[target.max_code]
+        yield result('call', 1, measure(
+            lambda: function(1, 2).to_python(), repeat))
+        for size in sizes:
+            vector = target.vector(size)
+            times = repeat_for(size, repeat)
+
+            def set_vector() -> None:
+                inter['bench_value'] = vector
+                inter.get(target.scalar_code)
+            yield result('set_vector', size, measure(set_vector, times))
+            yield result('get_vector', size, measure(
+                lambda: inter['bench_value'].to_python(), times))
+        target.declare(inter, 'bench_frame')
+        for size in sizes:
+            # Making a data frame of 10M rows in python takes too long.
+            if size > 10 ** 6:
+                continue
+            data = target.frame(size)
+            times = repeat_for(size * 3, repeat)
+
+            def frame_round_trip() -> None:
+                inter['bench_frame'] = data
+                inter['bench_frame'].to_python()
+            yield result('frame', size, measure(frame_round_trip, times))
+            inter.collect()
+    finally:
+        inter.close()
+
+
+def run(interpreters: List[str], sizes: Optional[List[int]] = None,
+        repeat: int = 20) -> Dict[str, Any]:
+    '''
+    Run benchmarks of interpreters and return the report.
+    Interpreters which are not installed are skipped.
+    '''
+    results: List[Dict[str, Any]] = []
+    for name in interpreters:
+        target = TARGETS[name]
+        if target.available():
+            results.extend(run_target(target, sizes or SIZES, repeat))
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    '''
+    Find results whose median is slower than the baseline
+    by more than the tolerance.
+    '''
+    def key(result: Dict[str, Any]) -> tuple:
+        return result['interpreter'], result['name'], result['size']
+    base = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        old = base.get(key(result))
+        if old is not None and result['p50'] > old['p50'] * (1 + tolerance):
+            regressions.append(dict(
+                interpreter=result['interpreter'], name=result['name'],
+                size=result['size'], old=old['p50'], new=result['p50']))
+    return regressions
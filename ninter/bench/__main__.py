@@ -0,0 +1,46 @@
+'''
+Command line interface of benchmarks.
+'''
+from typing import List, Optional
+import argparse
+import json
+import sys
+from . import SIZES, TARGETS, compare, run
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='ninter-bench',
+        description='Measure latency and throughput of ninter.')
+    parser.add_argument('--interpreters', nargs='+', choices=list(TARGETS),
+                        default=list(TARGETS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES,
+                        help='Numbers of elements of payloads.')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Path of JSON of the results.')
+    parser.add_argument('--compare', help='JSON of results to compare.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Slower medians than this ratio are reported.')
+    args = parser.parse_args(argv)
+    report = run(args.interpreters, args.sizes, args.repeat)
+    for result in report['results']:
+        print(f"{result['interpreter']:5} {result['name']:10} "
+              f"{result['size']:>9} p50 {result['p50'] * 1000:10.3f} ms "
+              f"p99 {result['p99'] * 1000:10.3f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Slower: {regression['interpreter']} {regression['name']} "
+                  f"{regression['size']}: {regression['old'] * 1000:.3f} ms "
+                  f"-> {regression['new'] * 1000:.3f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+'''
+Registry of converters from python objects to code of interpreters.
+Converters are registered by full name of the type like
+'pyarrow.lib.Table', not by the type itself.
+And so, modules like pandas or pyarrow are not imported
+until an object of the type is converted.
+The name is '__module__' and '__qualname__' of the type,
+and some packages change '__module__' between versions.
+For example, it is 'pandas.DataFrame' in new pandas.
+
+>>> @RObject.converters.register('pyarrow.lib.Table')
+... def table_to_r(table, segments):
+...     return RObject._convert_to_interpreter(table.to_pandas(), segments)
+'''
+from typing import Any, Callable, Dict, Optional
+
+# (object, segments) -> code of the interpreter.
+Converter = Callable[[Any, Optional[list]], str]
+
+
+def type_name(cls: type) -> str:
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+class Registry:
+    '''
+    Converters of an InterpreterObject class.
+    Converter of a base class is used for its subclasses, too.
+    '''
+
+    def __init__(self) -> None:
+        self.converters: Dict[str, Converter] = {}
+
+    def register(self, name: str) -> Callable[[Converter], Converter]:
+        '''
+        Decorator to register a converter for the type name.
+        '''
+        def register_converter(converter: Converter) -> Converter:
+            self.converters[name] = converter
+            return converter
+        return register_converter
+
+    def find(self, obj: Any) -> Optional[Converter]:
+        for cls in type(obj).__mro__:
+            converter = self.converters.get(type_name(cls))
+            if converter is not None:
+                return converter
+        return None
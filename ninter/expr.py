@@ -0,0 +1,158 @@
+'''
+Lazy expressions of InterpreterObject.
+Operators and getting items of lazy objects do not talk with
+the interpreter. They just record nodes of a graph,
+and the graph is compiled to one expression when it is used,
+for example, by to_python.
+
+Same subexpressions are evaluated only once.
+They are assigned to local variables in the expression,
+and so, nothing is left in the interpreter.
+
+>>> x, y = r['x'], r['y']
+>>> s = x + y
+>>> (s * s - y).to_python()  # Only one round trip.
+'''
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Expr:
+    '''
+    Node of the graph.
+    Nodes are compared by their structure,
+    and so, same subexpressions are found even if they were made twice.
+
+    kind: str
+        'leaf', 'operator' or 'item'.
+    value: Any
+        Code of leaf, operator or key of item.
+    args: tuple of Expr
+        Operands.
+    '''
+    __slots__ = ('kind', 'value', 'args', 'source', '_hash')
+
+    def __init__(self, kind: str, value: Any, args: Tuple['Expr', ...] = ()
+                 ) -> None:
+        self.kind = kind
+        self.value = value
+        self.args = args
+        # Compiled code. It is cached because the node never changes.
+        self.source: Optional[str] = None
+        self._hash = hash((kind, value, tuple(arg._hash for arg in args)))
+
+    @classmethod
+    def leaf(cls, code: str) -> 'Expr':
+        return cls('leaf', code)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: Any) -> bool:
+        return self is other or (
+            isinstance(other, Expr) and self._hash == other._hash
+            and self.kind == other.kind and self.value == other.value
+            and self.args == other.args)
+
+
+class Syntax:
+    '''
+    How to write the graph in the language of the interpreter.
+    Inherit this and overwrite block to use local variables.
+    '''
+    # Operators of python side -> operators of the interpreter.
+    operators: Dict[str, str] = {}
+    # Deeper nodes are assigned to local variables,
+    # because parser of the interpreter may overflow on long chains.
+    max_depth = 64
+
+    def operator(self, operator: str, left: str, right: str) -> str:
+        return f'({left} {self.operators.get(operator, operator)} {right})'
+
+    def item(self, obj: str, key: Any) -> str:
+        return f'{obj}[{key!r}]'
+
+    def variable(self, number: int) -> str:
+        return f'ninter_e{number}'
+
+    def block(self, assignments: List[Tuple[str, str]], result: str) -> str:
+        '''
+        Make an expression which assigns local variables
+        and returns the result.
+        '''
+        raise NotImplementedError('Local variables are not supported.')
+
+    def render(self, node: Expr, codes: Dict[Expr, str]) -> str:
+        if node.kind == 'leaf':
+            return node.value
+        elif node.kind == 'operator':
+            left, right = node.args
+            return self.operator(node.value, codes[left], codes[right])
+        elif node.kind == 'item':
+            return self.item(codes[node.args[0]], node.value)
+        raise ValueError(f'Unknown kind of node: {node.kind}')
+
+    def compile(self, root: Expr) -> str:
+        '''
+        Compile the graph to one expression.
+        Nodes used twice or more, and too deep nodes
+        are assigned to local variables.
+        It does not use recursion because chains may be long.
+        '''
+        if root.source is not None:
+            return root.source
+        # Nodes in post order, and number of their parents.
+        order: List[Expr] = []
+        parents: Dict[Expr, int] = {}
+        stack: List[Tuple[Expr, bool]] = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                order.append(node)
+                continue
+            if node in parents:
+                parents[node] += 1
+                continue
+            parents[node] = 1
+            stack.append((node, True))
+            stack.extend((arg, False) for arg in reversed(node.args))
+        codes: Dict[Expr, str] = {}
+        depths: Dict[Expr, int] = {}
+        assignments: List[Tuple[str, str]] = []
+        for node in order:
+            code = self.render(node, codes)
+            depth = 1 + max((depths[arg] for arg in node.args), default=0)
+            if (node.kind != 'leaf' and node is not root
+                    and (parents[node] > 1 or depth >= self.max_depth)):
+                name = self.variable(len(assignments) + 1)
+                assignments.append((name, code))
+                code = name
+                depth = 0
+            codes[node] = code
+            depths[node] = depth
+        result = codes[root]
+        if assignments:
+            result = self.block(assignments, result)
+        root.source = result
+        return result
+
+
+class Compiled:
+    '''
+    Attribute like _name or _code.
+    If the object is lazy and it was not set,
+    it is compiled from the graph when it is used first.
+    '''
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.key = f'{name}_source'
+
+    def __get__(self, obj: Any, owner: Optional[type] = None) -> Any:
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.key)
+        if value is None and obj._lazy is not None:
+            value = obj._syntax.compile(obj._lazy)
+        return value
+
+    def __set__(self, obj: Any, value: Optional[str]) -> None:
+        obj.__dict__[self.key] = value
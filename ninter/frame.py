@@ -0,0 +1,159 @@
+'''
+Columnar binary format to exchange data frames.
+It is read and written by helpers.R, too.
+
+The layout is like below. Everything is little endian.
+- int32 number of columns, int32 number of rows
+- names of columns as strings
+- types of columns as strings
+  ('double', 'integer', 'logical', 'complex', 'factor' or 'character')
+- columns
+
+A column is
+- levels as strings (only factor)
+- int32 number of NA
+- values
+  (factor is written as integer codes starting from 1)
+- uint8 NA mask (only if number of NA is not 0)
+
+Strings are int32 count, int32 byte length
+and NUL terminated UTF-8 strings.
+'''
+from typing import Any, BinaryIO, List, Tuple
+import numpy as np
+import pandas as pd
+from .transport import write_strings
+
+INT_NA = -2 ** 31
+
+COLUMN_DTYPES = {
+    'double': '<f8',
+    'integer': '<i4',
+    'factor': '<i4',
+    'logical': '|u1',
+    'complex': '<c16',
+}
+
+
+class FrameReader:
+    '''
+    Reader of the format with offset.
+    Arrays are views of the buffer and not copied.
+    '''
+
+    def __init__(self, buffer: Any) -> None:
+        self.buffer = buffer
+        self.offset = 0
+
+    def array(self, dtype: Any, count: int) -> np.ndarray:
+        result = np.frombuffer(self.buffer, dtype=dtype,
+                               count=count, offset=self.offset)
+        self.offset += result.nbytes
+        return result
+
+    def strings(self) -> List[str]:
+        count, nbytes = self.array('<i4', 2)
+        block = bytes(self.buffer[self.offset:self.offset + nbytes])
+        self.offset += int(nbytes)
+        return block.decode().split('\0')[:count]
+
+    def column(self, inter_type: str, nrow: int) -> Any:
+        if inter_type == 'factor':
+            levels = self.strings()
+        n_na = self.array('<i4', 1)[0]
+        if inter_type == 'character':
+            values = np.array(self.strings(), dtype=object)
+        else:
+            values = self.array(COLUMN_DTYPES[inter_type], nrow)
+        mask = self.array(np.bool_, nrow) if n_na else None
+        if inter_type == 'factor':
+            codes = values - 1
+            if mask is not None:
+                codes[mask] = -1
+            return pd.Categorical.from_codes(codes, levels)
+        elif inter_type == 'integer' and mask is not None:
+            return pd.arrays.IntegerArray(values, mask.copy())
+        elif inter_type == 'logical':
+            values = values.view(np.bool_)
+            if mask is not None:
+                return pd.arrays.BooleanArray(values, mask.copy())
+        elif mask is not None:
+            values[mask] = np.nan if inter_type != 'character' else None
+        return values
+
+
+def read_frame(buffer: Any) -> pd.DataFrame:
+    '''
+    Make DataFrame from the columnar format.
+    The buffer should be writable, for example bytearray.
+    '''
+    reader = FrameReader(buffer)
+    ncol, nrow = reader.array('<i4', 2)
+    names = reader.strings()
+    types = reader.strings()
+    columns = [reader.column(inter_type, int(nrow)) for inter_type in types]
+    return pd.DataFrame(dict(zip(range(int(ncol)), columns))).set_axis(
+        names, axis=1)
+
+
+def column_type(column: pd.Series) -> str:
+    '''
+    Choose type of R for a column of pandas.
+    Integers which do not fit in int32 of R become double.
+    '''
+    dtype = column.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return 'factor'
+    elif pd.api.types.is_bool_dtype(dtype):
+        return 'logical'
+    elif pd.api.types.is_integer_dtype(dtype):
+        if len(column) == 0 or (column.min() > INT_NA
+                                and column.max() < 2 ** 31):
+            return 'integer'
+        return 'double'
+    elif pd.api.types.is_float_dtype(dtype):
+        return 'double'
+    elif pd.api.types.is_complex_dtype(dtype):
+        return 'complex'
+    return 'character'
+
+
+def write_column(f: BinaryIO, column: pd.Series, inter_type: str) -> None:
+    mask = column.isna().to_numpy()
+    n_na = int(mask.sum())
+    if inter_type == 'factor':
+        write_strings(f, [str(level) for level in column.cat.categories])
+        values = column.cat.codes.to_numpy().astype('<i4') + 1
+        values[mask] = INT_NA
+    elif inter_type == 'integer':
+        values = column.to_numpy(dtype='<i4', na_value=INT_NA)
+    elif inter_type == 'logical':
+        values = column.to_numpy(dtype=np.bool_, na_value=False)
+    elif inter_type == 'character':
+        values = None
+    else:
+        values = column.to_numpy(dtype=COLUMN_DTYPES[inter_type],
+                                 na_value=np.nan)
+    f.write(np.array([n_na], dtype='<i4'))
+    if values is None:
+        write_strings(f, ['NA' if na else str(value)
+                          for value, na in zip(column, mask)])
+    else:
+        f.write(np.ascontiguousarray(values))
+    if n_na:
+        f.write(mask.astype(np.uint8))
+
+
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    '''
+    Write DataFrame as the columnar format.
+    Index is not written like write.csv(row.names=FALSE).
+    '''
+    columns = [df.iloc[:, n] for n in range(df.shape[1])]
+    types = [column_type(column) for column in columns]
+    with open(path, 'wb') as f:
+        f.write(np.array(df.shape[::-1], dtype='<i4'))
+        write_strings(f, [str(name) for name in df.columns])
+        write_strings(f, types)
+        for column, inter_type in zip(columns, types):
+            write_column(f, column, inter_type)
@@ -15,33 +15,116 @@ The way to build a interface is like below.
 Not very easy.
 It may be big class to fit interpreter perfectly.
 """
-from typing import Any, Optional, List, Union, Tuple, Dict, cast
-from os import environ
-from subprocess import Popen, PIPE, STDOUT
-from io import StringIO
-import uuid
-import csv
+from typing import (Any, Optional, List, Union, Tuple, Dict, Callable, cast,
+                    TYPE_CHECKING)
+from os import environ, path
 import json
-import numpy as np
-import pandas as pd
-from .base import Command, InterpreterObject, InterpreterException, Interpreter
+from .base import (Command, InterpreterObject, InterpreterException,
+                   Interpreter, Future, ServerCommand, OPERATION_HEAD)
+from .expr import Expr, Syntax
+from .convert import Registry
+from . import transport, warm
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# Helper functions sourced by R when it starts.
+R_HELPERS = path.join(path.dirname(__file__), 'helpers.R').replace('\\', '/')
+# RPC servers run by RServerCommand and DenoServerCommand.
+R_SERVER = path.join(path.dirname(__file__), 'server.R')
+DENO_SERVER = path.join(path.dirname(__file__), 'server.js')
+
+
+def parse_header(value: str) -> Tuple[Dict[str, Any], str]:
+    '''
+    Parse output of '.ninter$fetch' in helpers.R.
+    It returns the header as dict and text after the header.
+    '''
+    lines = value.split('\n')
+    for n, line in enumerate(lines):
+        if line.startswith('ninter\t'):
+            break
+    else:
+        raise InterpreterException(value)
+    text = '\n'.join(lines[n+1:])
+    fields = line.split('\t')
+    if fields[1] == 'error':
+        return {'status': 'error'}, text
+    return {
+        'status': fields[1],
+        'class': fields[2].split(','),
+        'type': fields[3],
+        'dim': tuple(int(d) for d in fields[4].split(',') if d),
+        'length': int(fields[5]),
+        'na': int(fields[6]),
+        'kind': fields[7],
+        'names': fields[8:],
+    }, text
 
 
 class RCommand(Command):
-    def __init__(self) -> None:
-        self.inter = Popen(['R', '--vanilla', '--quiet', '--no-readline'],
-                           stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        to_send, to_get = self.make_key_pair(
-            str(uuid.uuid1()).replace('-', '_'))
-        self.write(to_send)
-        self.flush()
-        while True:
-            if self.readline() == to_get:
-                break
+    args = ['R', '--vanilla', '--quiet', '--no-readline']
+
+    def __init__(self, start: bool = True, framed: bool = False) -> None:
+        self.framed = framed
+        if start:
+            self.start()
+
+    def make_setup(self) -> str:
+        return f'source("{R_HELPERS}")\n'
 
     def make_code(self, code: str) -> str:
         return f'try({code})' + '\n'
 
+    def make_frame_code(self, code: str, key: str) -> str:
+        '''
+        The code is passed as a string and parsed by '.ninter$framed',
+        and so, a syntax error is an error frame.
+        JSON string is a valid string literal of R.
+        '''
+        return (f'.ninter$framed("{key}", '
+                f'{json.dumps(code, ensure_ascii=False)})\n')
+
+    def make_delete_command(self, names: List[str]) -> str:
+        '''
+        Tmp variable which failed to be assigned may not exist.
+        '''
+        listed = ', '.join(f'"{name}"' for name in names)
+        return (f'suppressWarnings(rm(list = c({listed}), '
+                f'envir = globalenv()))')
+
+    def make_call_command(self, name: str, code: str) -> str:
+        '''
+        If the call fails, the condition is assigned
+        and '.ninter$fetch' of the name reports the error.
+        '''
+        return f'{name} <- tryCatch({code}, error = function(e) e)'
+
+    def make_fetch_command(self, code: str,
+                           buffer_path: Optional[str] = None) -> str:
+        '''
+        Fetch the value by '.ninter$fetch'.
+        If buffer_path is None, only the header is printed.
+        '''
+        if buffer_path is None:
+            return f'.ninter$fetch(quote({code}))'
+        return f'.ninter$fetch(quote({code}), "{buffer_path}")'
+
+    def make_fetch_many_command(self, codes: List[str],
+                                buffer_paths: List[str]) -> str:
+        '''
+        Fetch values by '.ninter$fetch' in one block.
+        It is not a get operation of the server but eval.
+        '''
+        body = ''.join(
+            f'.ninter$fetch(quote({code}), "{buffer_path}"); cat("\\036\\n"); '
+            for code, buffer_path in zip(codes, buffer_paths))
+        return f'{{{body}invisible()}}'
+
+    def make_update_command(self, assignments: List[Tuple[str, str]]) -> str:
+        body = ''.join(f'{name} <- {value}; ' for name, value in assignments)
+        return f'{{{body}invisible()}}'
+
     def make_key_pair(self, time_stamp: str) -> Tuple[str, str]:
         return (
             f'print("{self.make_stamp(time_stamp)}")\n',
@@ -68,20 +151,83 @@ class RCommand(Command):
     def close(self) -> None:
         return f'q("yes")'
 
+    def make_close_code(self) -> str:
+        '''
+        Framed code is parsed by R, and the server's too,
+        and ';' at the head is a syntax error.
+        '''
+        if self.framed:
+            return self.close()
+        return super().make_close_code()
+
+
+class RServerCommand(ServerCommand, RCommand):
+    '''
+    R which runs server.R by Rscript instead of REPL.
+    Code is not wrapped by try and errors are status of responses.
+    '''
+    args = ['Rscript', '--vanilla', R_SERVER]
+
+    def make_fetch_command(self, code: str,
+                           buffer_path: Optional[str] = None) -> str:
+        return f'{OPERATION_HEAD}get {buffer_path or ""}\n{code}'
+
+    def close(self) -> None:
+        return 'q("no")'
+
+
+# Printed by Deno instead of JSON when the JSON is in a segment.
+# Binary arrays are printed as
+#   ninter-segment <typed or numbers> <TypedArray> <length>
+SEGMENT_HEAD = 'ninter-segment'
+
+# ninterArray makes TypedArray of numpy array from a segment or numbers.
+# ninterFetch prints JSON of the value, or writes it in a segment.
+# TypedArray, ArrayBuffer and array of numbers (if it is longer than
+# min_numbers) are written as raw bytes.
+DENO_HELPERS = '''
+PythonObjects.ninterArray = (source, type, shape) => { let flat; if (typeof source === "string") { const bytes = Deno.readFileSync(source); flat = new type(bytes.buffer, bytes.byteOffset, bytes.byteLength / type.BYTES_PER_ELEMENT); } else { flat = type.from(source); } const nest = (offset, axis) => { if (axis === shape.length - 1) { return flat.subarray(offset, offset + shape[axis]); } const size = shape.slice(axis + 1).reduce((a, b) => a * b, 1); return Array.from({ length: shape[axis] }, (_, i) => nest(offset + i * size, axis + 1)); }; return shape.length === 1 ? flat : nest(0, 0); };
+PythonObjects.ninterFetch = (x, path, threshold, min_numbers) => { let typed = x instanceof ArrayBuffer ? new Uint8Array(x) : ArrayBuffer.isView(x) && !(x instanceof DataView) ? x : undefined; let kind = "typed"; if (typed === undefined && Array.isArray(x) && x.length >= min_numbers && x.every((v) => typeof v === "number")) { kind = "numbers"; typed = x.every((v) => Number.isInteger(v) && v >= -2147483648 && v <= 2147483647) ? Int32Array.from(x) : Float64Array.from(x); } if (typed !== undefined) { Deno.writeFileSync(path, new Uint8Array(typed.buffer, typed.byteOffset, typed.byteLength)); console.log(`%s ${kind} ${typed.constructor.name} ${typed.length}`); return; } const s = JSON.stringify(x); if (s !== undefined && s.length > threshold) { Deno.writeTextFileSync(path, s); console.log("%s"); } else { console.log(s); } };
+''' % (SEGMENT_HEAD, SEGMENT_HEAD)
+
+# Function of framed protocol in Deno.
+# ninterEval runs the code by indirect eval in global scope
+# and writes a frame of console.log output and the value.
+# Syntax errors are thrown by eval, and so, they are error frames.
+
+DENO_FRAME_HELPERS = '''
+PythonObjects.ninterEval = (id, code) => { const log = console.log; const buffer = []; console.log = (...args) => { buffer.push(args.map((a) => typeof a === "string" ? a : Deno.inspect(a)).join(" ") + "\\n"); }; let failed = false; try { const value = (0, eval)(code); if (value !== undefined) { buffer.push(Deno.inspect(value) + "\\n"); } } catch (e) { failed = true; buffer.push(`Uncaught ${e}\\n`); } finally { console.log = log; } const encoder = new TextEncoder(); const body = encoder.encode(buffer.join("")); const head = encoder.encode(`\\x02ninter ${id} ${failed ? "error" : "ok"} ${body.length}\\n`); const data = new Uint8Array(head.length + body.length); data.set(head); data.set(body, head.length); let n = 0; while (n < data.length) { n += Deno.stdout.writeSync(data.subarray(n)); } };
+'''
+
 
 class DenoCommand(Command):
-    def __init__(self) -> None:
-        environ['NO_COLOR'] = '1'
-        self.inter = Popen(['deno'],
-                           stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        self.write('let PythonObjects = {};')
-        to_send, to_get = self.make_key_pair(
-            str(uuid.uuid1()).replace('-', '_'))
-        self.write(to_send)
-        self.flush()
-        while True:
-            if self.readline() == to_get:
-                break
+    args = ['deno']
+
+    def __init__(self, start: bool = True, framed: bool = False) -> None:
+        self.framed = framed
+        if start:
+            self.start()
+
+    def make_env(self) -> Optional[Dict[str, str]]:
+        return dict(environ, NO_COLOR='1')
+
+    def interrupt(self) -> bool:
+        '''
+        JavaScript can not be interrupted and SIGINT kills Deno.
+        '''
+        return False
+
+    def make_setup(self) -> str:
+        return 'let PythonObjects = {};' + DENO_HELPERS + DENO_FRAME_HELPERS
+
+    def make_frame_code(self, code: str, key: str) -> str:
+        '''
+        The code is passed as JSON string and run by 'ninterEval',
+        and so, a syntax error does not break the line.
+        Like the server, 'let' and 'const' in it do not live after it.
+        Output of REPL itself is out of the frame and skipped.
+        '''
+        return f'PythonObjects.ninterEval("{key}", {json.dumps(code)})\n'
 
     def make_key_pair(self, time_stamp: str) -> Tuple[str, str]:
         return (
@@ -95,28 +241,29 @@ class DenoCommand(Command):
     def make_code(self, code: str) -> str:
         return f'{code}' + ';'
 
-    def make_let_command(self, name: str, value: Any) -> str:
+    def make_let_command(self, name: str, value: str) -> str:
         '''
         Make const in interpreter.
         If there is no let in the interpreter, it does not anything.
+        The value is a code made by DenoObject._convert_to_interpreter.
+        In framed mode, code is run by eval and 'var' is used instead.
         '''
-        if isinstance(value, DenoObject):
-            return f"let {name} = {value._code}"
-        elif isinstance(value, InterpreterObject):
-            return f"let {name} = JSON.parse('{json.dumps(value.to_python())}')"
-        return f"let {name} = JSON.parse({json.dumps(value)})"
+        if self.framed:
+            return f'var {name} = {value}'
+        return f"let {name} = {value}"
 
-    def make_const_command(self, name: str, value: Any) -> str:
+    def make_const_command(self, name: str, value: str) -> str:
         '''
         Make const in interpreter.
         If there is no const in the interpreter,
         it is same as let in the interpreter.
+        The value is a code made by DenoObject._convert_to_interpreter.
+        In framed mode, it is a property which is not writable.
         '''
-        if isinstance(value, DenoObject):
-            return f"const {name} = {value._code}"
-        elif isinstance(value, InterpreterObject):
-            return f"const {name} = JSON.parse('{json.dumps(value.to_python())}')"
-        return f"const {name} = JSON.parse({json.dumps(value)})"
+        if self.framed:
+            return (f'Object.defineProperty(globalThis, "{name}", '
+                    f'{{value: {value}, writable: false, enumerable: true}});')
+        return f"const {name} = {value}"
 
     def make_tmp_variable(self, stamp: str) -> str:
         '''
@@ -124,10 +271,97 @@ class DenoCommand(Command):
         '''
         return f'PythonObjects.py{stamp}'
 
+    def make_delete_command(self, names: List[str]) -> str:
+        return ' '.join(f'delete {name};' for name in names)
+
+    def make_call_command(self, name: str, code: str) -> str:
+        '''
+        Assign result of a call to the name.
+        If it throws, the error is assigned.
+        '''
+        return f'try{{{name} = {code};}}catch(er){{{name}=er}}'
+
+    def make_fetch_command(self, code: str, buffer_path: str,
+                           min_numbers: int) -> str:
+        '''
+        Print the value by 'ninterFetch'.
+        '''
+        return (f'try{{PythonObjects.ninterFetch({code},"{buffer_path}",'
+                f'{transport.threshold},{min_numbers})}}'
+                'catch(e){console.log("JS error:", e)}')
+
+    def make_fetch_many_command(self, codes: List[str],
+                                buffer_paths: List[str],
+                                min_numbers: int) -> str:
+        '''
+        Print values by 'ninterFetch' in one statement.
+        It is not a get operation of the server but eval.
+        '''
+        return ''.join(
+            DenoCommand.make_fetch_command(self, code, buffer_path,
+                                           min_numbers)
+            + 'console.log("\\x1e");'
+            for code, buffer_path in zip(codes, buffer_paths))
+
+    def make_update_command(self, assignments: List[Tuple[str, str]]) -> str:
+        return ' '.join(f'{name} = {value};' for name, value in assignments)
+
     def close(self) -> None:
         return f'close()'
 
 
+class DenoServerCommand(ServerCommand, DenoCommand):
+    '''
+    Deno which runs server.js instead of REPL.
+    Variables are properties of globalThis.
+    'let' and 'const' in code sent by get do not live after it,
+    use 'var' instead.
+    '''
+    args = ['deno', 'run', '--allow-all', DENO_SERVER]
+
+    def make_setup(self) -> str:
+        return 'var PythonObjects = {};' + DENO_HELPERS
+
+    def make_fetch_command(self, code: str, buffer_path: str,
+                           min_numbers: int) -> str:
+        return (f'{OPERATION_HEAD}get {buffer_path} {transport.threshold} '
+                f'{min_numbers}\n{code}')
+
+
+class RSyntax(Syntax):
+    '''
+    Lazy expression is compiled to local({...}) in R.
+    Item is got by '.ninter$item' which does not need to ask is.list.
+    '''
+    operators = {'===': '==', '!==': '!=', '||': '|', '&&': '&'}
+
+    def item(self, obj: str, key: Any) -> str:
+        if isinstance(key, str):
+            return f'.ninter$item({obj}, "{key}")'
+        return f'.ninter$item({obj}, {int(key)})'
+
+    def variable(self, number: int) -> str:
+        return f'.ninter_e{number}'
+
+    def block(self, assignments: List[Tuple[str, str]], result: str) -> str:
+        body = ''.join(f'{name} <- {code}; ' for name, code in assignments)
+        return f'local({{{body}{result}}})'
+
+
+class DenoSyntax(Syntax):
+    '''
+    Lazy expression is compiled to an arrow function called at once.
+    '''
+
+    def item(self, obj: str, key: Any) -> str:
+        return f'{obj}[{json.dumps(key)}]'
+
+    def block(self, assignments: List[Tuple[str, str]], result: str) -> str:
+        body = ''.join(f'const {name} = {code}; '
+                       for name, code in assignments)
+        return f'(() => {{ {body}return {result}; }})()'
+
+
 class RObject(InterpreterObject):
     '''
     Wrapper of R object to deal it in python world.
@@ -135,6 +369,9 @@ class RObject(InterpreterObject):
     because of nature of R language.
     '''
 
+    _syntax = RSyntax()
+    converters = Registry()
+
     def __init__(self, name: str, interpreter: Interpreter,
                  code: Optional[str] = None,
                  value: Optional[str] = None) -> None:
@@ -143,6 +380,8 @@ class RObject(InterpreterObject):
         self._value = value
         self._inter = interpreter
         self._inter_indent = 4
+        # Segments and tmp variables used by this object.
+        self._segments: List[Any] = []
 
     def __call__(self, *args: Any, kwargs: dict = {}) -> 'RObject':
         '''
@@ -168,25 +407,44 @@ class RObject(InterpreterObject):
         >>> print(0.5285171 < result['p.value'].to_python() < 0.5285173)
         True
         '''
+        self._inter._count('call')
+        return self._send_call(*self._make_call(args, kwargs))
+
+    def _send_call(self, code: str, segments: List[Any]) -> 'RObject':
+        '''
+        Assign result of the call to a tmp variable without waiting.
+        '''
+        variable = self._inter.make_remote_variable()
+        self._inter.send(
+            self._inter.command.make_call_command(variable.name, code))
+        self._inter.flush()
+        result = self.__class__(name=code, code=variable.name,
+                                interpreter=self._inter)
+        result._segments = segments + [variable]
+        return result
+
+    def _make_call(self, args: tuple,
+                   kwargs: dict) -> Tuple[str, List[Any]]:
+        '''
+        Make code to call this function and segments used by it.
+        Tmp variables used by the code are kept with segments.
+        '''
+        segments: List[Any] = list(self._segments)
+        for arg in (*args, *kwargs.values()):
+            if isinstance(arg, RObject):
+                segments.extend(arg._segments)
         code_args = ",".join(
             arg._code if isinstance(arg, RObject)
-            else RObject._convert_to_interpreter(arg)
+            else RObject._convert_to_interpreter(arg, segments)
             for arg in args)
         code_kwargs = ",".join([
-            f'{key}={kwargs[key].code}'
+            f'{key}={kwargs[key]._code}'
             if isinstance(kwargs[key], RObject)
-            else f'{key}={RObject._convert_to_interpreter(kwargs[key])}'
+            else f'{key}={RObject._convert_to_interpreter(kwargs[key], segments)}'
             for key in kwargs])
         if kwargs:
-            code = f'{self._code}({code_args}, {code_kwargs})'
-        else:
-            code = f'{self._code}({code_args})'
-        time_stamp = str(uuid.uuid1()).replace('-', '_')
-        tmp_name = self._inter.make_tmp_variable(time_stamp)
-        self._inter.send(f'{tmp_name} <- {code}')
-        self._inter.flush()
-        return RObject(name=code, code=tmp_name,
-                       interpreter=self._inter)
+            return f'{self._code}({code_args}, {code_kwargs})', segments
+        return f'{self._code}({code_args})', segments
 
     def __getitem__(self, name: Union[int, str, tuple]) -> 'RObject':
         '''
@@ -195,8 +453,12 @@ class RObject(InterpreterObject):
         For example, $ or [[1]] operators.
 
         Slice function is not developped well.
+        Item of lazy object is lazy, too.
         '''
-        if self._inter.get(f'is.list({self._code})').strip() == '[1] TRUE':
+        if self._lazy is not None and isinstance(name, (int, str)):
+            return self._make_lazy(Expr('item', name, (self._lazy,)),
+                                   list(self._segments))
+        if self.metadata()['type'] == 'list':
             if isinstance(name, str):
                 code = f'{self._code}${name}'
             elif isinstance(name, int):
@@ -214,20 +476,21 @@ class RObject(InterpreterObject):
             else:
                 raise BaseException(
                     'In this case, slice should be int or slice')
-        return RObject(name=code, code=code, interpreter=self._inter)
-
-    def _operator(self, obj: Any, operator: str) -> 'InterpreterObject':
-        if not isinstance(obj, RObject):
-            obj = RObject._convert_to_interpreter(obj)
-        code = f'({self._code} {operator} {obj})'
-        time_stamp = str(uuid.uuid1()).replace('-', '_')
-        tmp_name = self._inter.make_tmp_variable(time_stamp)
-        # print(f'{tmp_name} <- {code};')
-        return RObject(name=code, code=tmp_name, interpreter=self._inter)
+        result = RObject(name=code, code=code, interpreter=self._inter)
+        result._segments = list(self._segments)
+        return result
 
     def __setitem__(self, key: str, obj: Any) -> None:
-        code = f'{self._code}${key} <- {self._convert_to_interpreter(obj)}'
-        self._inter.send(code)
+        self._inter.send(self._make_setitem(key, obj))
+
+    def _make_setitem(self, key: str, obj: Any) -> str:
+        '''
+        Make code to set item and invalidate metadata of this object.
+        '''
+        self._inter.metadata.invalidate(self._name)
+        self._inter.metadata.invalidate(self._code)
+        return (f'{self._code}${key} <- '
+                f'{self._convert_to_interpreter(obj, self._segments)}')
 
     def __setattr__(self, key: str, obj: Any) -> None:
         InterpreterObject.__setattr__(self, key, obj)
@@ -235,112 +498,180 @@ class RObject(InterpreterObject):
     def __str__(self) -> str:
         return f'RObject[{self._name}: {self._code}]'
 
-    def _convert_character(self) -> Union[List[str], str]:
+    def _convert_character(self, header: Dict[str, Any],
+                           buffer: Any, scalar: bool = True) -> Any:
         '''
-        Convert strings of R into RObject.
+        Convert character vector or factor of R.
+        It returns str if the length is 1 and scalar is True.
         '''
-        length = self._inter.get(
-            f'length({self._name})')[self._inter_indent:].strip()
-        if length == '1':
-            value = self._inter.get(self._name).strip()
-            return value[self._inter_indent+1:len(value)-1]
-        value = self._inter.get(
-            f'write.csv({self._name}, row.names=FALSE)').strip()
-        return [s[1:-1] for s
-                in value[self._inter_indent:len(value)].split('\n')]
-
-    def _convert_numeric(self) -> Union[float, list]:
+        strings = transport.read_strings(buffer)
+        if header['dim']:
+            import numpy as np
+            return np.array(strings, dtype=object).reshape(
+                header['dim'], order='F')
+        if scalar and header['length'] == 1:
+            return strings[0]
+        return strings
+
+    def _convert_vector(self, header: Dict[str, Any], buffer: Any,
+                        scalar: bool = True) -> Any:
         '''
-        Convert numeric of R into RObject.
+        Convert atomic vector, matrix or array of R into numpy array.
+        R writes raw bytes into a file and python reads it,
+        and so, precision is not lost by print.
         '''
-        r_key = self._inter.send(self._name)
-        length_key = self._inter.send(f'length({self._name})')
-        self._inter.flush()
-        value = self._inter.receive_by_key(r_key).strip()
-        length = self._inter.receive_by_key(
-            length_key)[self._inter_indent:].strip()
-        if length == '1':
-            return float(self._remove_index(value)[0])
-        return [float(i) for i in
-                ' '.join(self._remove_index(value)).split(' ')
-                if i != '']
-
-    def _remove_index(self, text: str) -> List[str]:
-        return [line[line.index(']')+1:] for line in
-                text.split('\n')]
-
-    def _convert_matrix(self) -> np.array:
+        values = transport.decode_vector(
+            buffer, header['type'], header['length'], header['na'],
+            scalar=scalar and not header['dim'])
+        if header['dim']:
+            return values.reshape(header['dim'], order='F')
+        return values
+
+    def _convert_dataframe(self, header: Dict[str, Any],
+                           buffer: Any) -> 'pd.DataFrame':
         '''
-        Convert matrix of R into RObject.
+        Convert data.frame of R into pandas.DataFrame.
         '''
-        value = self._inter.get(f'write.csv({self._name})').strip()
-        return np.array(list(csv.reader(value.strip().split('\n'))))
+        from . import frame
+        return frame.read_frame(buffer)
 
-    def _convert_dataframe(self) -> pd.DataFrame:
+    def metadata(self) -> Dict[str, Any]:
         '''
-        Convert data.frame of R into RObject.
+        Header of '.ninter$fetch' without payload.
+        It is cached by code of this object.
+        Name of a result of a call is the call itself,
+        and so, code, which is the tmp variable, is fetched instead
+        not to run the function again.
         '''
-        value = self._inter.get(
-            f'write.csv({self._name}, row.names=FALSE)').strip()
-        with StringIO(value) as data:
-            df = pd.read_csv(data)
-        return df
-
-    def to_python(self) -> Any:
+        header = self._inter.metadata.get(self._code)
+        if header is None:
+            header = self._submit_metadata().result()
+        return header
+
+    def _submit_metadata(self) -> Future:
+        return self._inter.submit(
+            self._inter.command.make_fetch_command(self._code),
+            self._parse_metadata)
+
+    def _parse_metadata(self, value: str) -> Dict[str, Any]:
+        header, text = parse_header(value)
+        if header['status'] == 'error':
+            raise InterpreterException('\n' + text.strip())
+        self._inter.metadata.set(self._code, header)
+        return header
+
+    def to_python(self, timeout: Optional[float] = None) -> Any:
         '''
         This method just takes some R object from world of R.
         It does not record any objects in python world.
+        Type of the object and its payload are got
+        in one round trip by '.ninter$fetch'.
+        If it is known to be function or list, no round trip is needed.
         '''
-        name_key = self._inter.send(f'class({self._name})')
-        self._inter.send(f'typeof({self._name})')
-        self._inter.send(f'is.vector({self._name})')
-        self._inter.send(f'class(try({self._name}))')
-        self._inter.flush()
+        self._inter._count('to_python')
+        return self._submit().result(timeout)
+
+    def _submit(self) -> Future:
+        header = self._inter.metadata.get(self._code)
+        if header is not None and header['kind'] == 'object':
+            return Future.completed(self)
+        buffer_path = transport.make_buffer_path()
+        return self._inter.submit(
+            self._inter.command.make_fetch_command(self._code, buffer_path),
+            lambda value: self._convert(value, buffer_path))
+
+    def _count_rows(self) -> int:
+        '''
+        Rows of data frame or matrix, or length of vector.
+        '''
+        header = self.metadata()
+        if len(header['dim']) == 2:
+            return header['dim'][0]
+        return header['length']
+
+    def _submit_chunk(self, start: int, stop: int) -> Future:
+        buffer_path = transport.make_buffer_path()
+        return self._inter.submit(
+            self._inter.command.make_fetch_command(
+                f'.ninter$rows({self._code}, {start + 1}, {stop})',
+                buffer_path),
+            lambda value: self._convert(value, buffer_path, chunk=True))
 
-        inter_class = self._inter.receive_by_key(
-            name_key)[self._inter_indent:].strip()
-        inter_type = self._inter.receive_one()[1][
-            self._inter_indent:].strip()
-        is_vector = self._inter.receive_one()[1][
-            self._inter_indent:].strip() == 'TRUE'
-        error = self._inter.receive_one()[1].strip().split('\n')
-        if error[-1][self._inter_indent:].strip() == '"try-error"':
-            raise InterpreterException('\n'+'\n'.join(error[0:-1]))
-
-        if is_vector:
-            if inter_class == '"character"':
-                return self._convert_character()
-            elif inter_class == '"numeric"':
-                return self._convert_numeric()
-        else:
-            if inter_class == '"matrix"':
-                return self._convert_matrix()
-            elif inter_class == '"data.frame"':
-                return self._convert_dataframe()
-            elif inter_class == '"function"' or inter_class == '"list"':
-                return self
-            else:
-                return self._inter.get(self._name).strip()
+    @classmethod
+    def _make_fetch_many(cls, interpreter: Interpreter,
+                         objects: List[InterpreterObject]
+                         ) -> Tuple[str, List[str]]:
+        buffer_paths = [transport.make_buffer_path() for _ in objects]
+        return interpreter.command.make_fetch_many_command(
+            [obj._code for obj in objects], buffer_paths), buffer_paths
+
+    def _convert(self, value: str, buffer_path: str,
+                 chunk: bool = False) -> Any:
+        '''
+        Convert output of '.ninter$fetch' and its payload.
+        Slices of iter_chunks are not cached as metadata
+        and vectors of length 1 are not made scalar.
+        '''
+        header, text = parse_header(value)
+        if header['status'] == 'error':
+            raise InterpreterException('\n' + text.strip())
+        if not chunk:
+            self._inter.metadata.set(self._code, header)
+        kind = header['kind']
+        self._count_conversion(kind)
+        if kind == 'object':
+            return self
+        elif kind == 'print':
+            return text.strip()
+        buffer = transport.read_buffer(buffer_path)
+        if kind == 'character':
+            return self._convert_character(header, buffer, not chunk)
+        elif kind == 'frame':
+            return self._convert_dataframe(header, buffer)
+        return self._convert_vector(header, buffer, not chunk)
 
     @classmethod
-    def _convert_to_interpreter(cls, obj: Any) -> str:
+    def _convert_to_interpreter(
+            cls, obj: Any,
+            segments: Optional[List[transport.Segment]] = None) -> str:
+        '''
+        Big payloads are written in segments and
+        the segments are appended to 'segments'.
+        The caller should keep them until R reads them.
+        Other types like DataFrame are converted by 'converters'.
+        '''
         if isinstance(obj, InterpreterObject):
             obj = obj.to_python()
         if isinstance(obj, str):
+            if len(obj) > transport.threshold:
+                segment = transport.own(
+                    transport.Segment(obj.encode()), segments)
+                return f'.ninter$read_text("{segment.path}")'
             return f'"{obj}"'
         elif isinstance(obj, bool):
             return 'TRUE' if obj else 'FALSE'
         elif isinstance(obj, (int, float)):
             return str(obj)
         elif isinstance(obj, (tuple, list)):
-            return f'c{tuple(obj)}'
-        if isinstance(obj, pd.DataFrame):
-            csv_tmp = obj.to_csv(columns=None, index=False)
-            return f'read.csv(header=TRUE,sep=",",text="{csv_tmp}")'
-        else:
-            return ''
+            if (len(obj) * 8 > transport.threshold
+                    and all(isinstance(i, (int, float))
+                            and not isinstance(i, bool) for i in obj)):
+                import numpy as np
+                segment = transport.own(transport.Segment(
+                    np.asarray(obj, dtype='<f8')), segments)
+                return (f'.ninter$read_vector("{segment.path}", '
+                        f'"double", {len(obj)})')
+            return 'c(' + ', '.join(
+                cls._convert_to_interpreter(i, segments) for i in obj) + ')'
+        converter = cls.converters.find(obj)
+        if converter is not None:
+            return converter(obj, segments)
+        return ''
 
 class DenoObject(InterpreterObject):
+    _syntax = DenoSyntax()
+    converters = Registry()
+
     def __init__(self, name: str, interpreter: Interpreter,
                  code: Optional[str] = None,
                  value: Optional[str] = None) -> None:
@@ -348,22 +679,152 @@ class DenoObject(InterpreterObject):
         self._code = code if code else name
         self._value = value
         self._inter = interpreter
+        # Segments and tmp variables used by this object.
+        self._segments: List[Any] = []
 
     @classmethod
-    def _convert_to_interpreter(cls, obj: Any) -> str:
+    def _convert_to_interpreter(
+            cls, obj: Any,
+            segments: Optional[List[transport.Segment]] = None) -> str:
+        '''
+        Big JSON is written in a segment and Deno reads it.
+        The segment is appended to 'segments' and
+        the caller should keep it until Deno reads it.
+        '''
         if isinstance(obj, InterpreterObject):
             obj = obj.to_python()
-        return json.dumps(obj)
+        converter = cls.converters.find(obj)
+        if converter is not None:
+            return converter(obj, segments)
+        text = json.dumps(obj)
+        if len(text) > transport.threshold:
+            segment = transport.own(
+                transport.Segment(text.encode()), segments)
+            return f'JSON.parse(Deno.readTextFileSync("{segment.path}"))'
+        return text
 
     def __str__(self) -> str:
         return f'DenoObject[{self._name}: {self._code}]'
 
-    def to_python(self) -> Any:
-        key = self._inter.send(
-            f'''try{{console.log(JSON.stringify({self._name}))}}catch(e){{console.log("JS error:", e)}}'''
-        )
-        self._inter.flush()
-        result = self._inter.receive_by_key(key)
+    def metadata(self) -> Dict[str, Any]:
+        '''
+        Type, class, length and keys of the object.
+        Keys are listed only for objects which are not array.
+        It is cached by name of this object.
+        '''
+        header = self._inter.metadata.get(self._code)
+        if header is None:
+            header = self._submit_metadata().result()
+        return header
+
+    def _submit_metadata(self) -> Future:
+        return self._inter.submit(
+            f'''try{{const x={self._code};console.log(JSON.stringify({{type:typeof x,class:x?.constructor?.name,is_array:Array.isArray(x),length:x?.length,names:x!==null&&typeof x==="object"&&!Array.isArray(x)?Object.keys(x):[]}}))}}catch(e){{console.log("JS error:", e)}}''',
+            self._parse_metadata)
+
+    def _parse_metadata(self, result: str) -> Dict[str, Any]:
+        try:
+            header = json.loads(result)
+        except json.decoder.JSONDecodeError:
+            raise InterpreterException(result)
+        self._inter.metadata.set(self._code, header)
+        return header
+
+    def to_python(self, timeout: Optional[float] = None) -> Any:
+        '''
+        Big JSON is written in a segment by Deno
+        and only the path is printed.
+        TypedArray and ArrayBuffer are passed as raw bytes
+        and they become numpy array.
+        Big array of numbers is passed as raw bytes, too,
+        but it becomes list as small one does.
+        '''
+        self._inter._count('to_python')
+        return self._submit().result(timeout)
+
+    def to_numpy(self, timeout: Optional[float] = None) -> Any:
+        '''
+        Same as to_python, but array of numbers becomes numpy array
+        even if it is small.
+        '''
+        self._inter._count('to_python')
+        return self._submit_fetch(
+            self._code, lambda result, buffer_path: self._convert(
+                result, buffer_path, numpy=True), 0).result(timeout)
+
+    def _submit(self) -> Future:
+        return self._submit_fetch(self._code, self._convert)
+
+    def _submit_fetch(self, code: str, convert: Callable[[str, str], Any],
+                      min_numbers: Optional[int] = None) -> Future:
+        '''
+        Future of the value of the code by 'ninterFetch'.
+        convert takes the output and path of the segment.
+        Array of numbers is sent as binary if it is not shorter than
+        min_numbers. By default, it is as long as JSON goes to a segment.
+        '''
+        if min_numbers is None:
+            min_numbers = transport.threshold // 8
+        buffer_path = transport.make_buffer_path()
+        return self._inter.submit(
+            self._inter.command.make_fetch_command(
+                code, buffer_path, min_numbers),
+            lambda result: convert(result, buffer_path))
+
+    def _count_rows(self) -> int:
+        length = self.metadata()['length']
+        if not isinstance(length, int):
+            raise InterpreterException(f'{self._code} has no length.')
+        return length
+
+    def _submit_chunk(self, start: int, stop: int) -> Future:
+        '''
+        Slice of array or TypedArray.
+        '''
+        return self._submit_fetch(
+            f'({self._code}).slice({start}, {stop})', self._convert_chunk, 0)
+
+    @classmethod
+    def _make_fetch_many(cls, interpreter: Interpreter,
+                         objects: List[InterpreterObject]
+                         ) -> Tuple[str, List[str]]:
+        buffer_paths = [transport.make_buffer_path() for _ in objects]
+        return interpreter.command.make_fetch_many_command(
+            [obj._code for obj in objects], buffer_paths,
+            transport.threshold // 8), buffer_paths
+
+    def _convert_chunk(self, result: str, buffer_path: str) -> Any:
+        '''
+        Array of records becomes DataFrame and others become numpy array.
+        '''
+        values = self._convert(result, buffer_path, numpy=True)
+        if (isinstance(values, list) and values
+                and all(isinstance(value, dict) for value in values)):
+            import pandas as pd
+            return pd.DataFrame.from_records(values)
+        import numpy as np
+        return np.asarray(values)
+
+    def _convert(self, result: str, buffer_path: str,
+                 numpy: bool = False) -> Any:
+        '''
+        Convert output of 'ninterFetch'.
+        If numpy is True, array of numbers is not made list.
+        '''
+        head = result.strip()
+        if head.startswith(SEGMENT_HEAD):
+            fields = head.split()
+            if len(fields) == 1:
+                self._count_conversion('segment')
+                return json.loads(transport.read_buffer(buffer_path)[:])
+            kind, array_type, length = fields[1:]
+            self._count_conversion(kind)
+            values = transport.decode_typed_array(
+                transport.read_buffer(buffer_path), array_type, int(length))
+            if kind == 'numbers' and not numpy:
+                return values.tolist()
+            return values
+        self._count_conversion('json')
         try:
             return json.loads(result)
         except json.decoder.JSONDecodeError as er:
@@ -380,34 +841,44 @@ class DenoObject(InterpreterObject):
         And so, it can treat python object
         and DenoObjects simultaneously.
         '''
+        self._inter._count('call')
+        return self._send_call(*self._make_call(args, kwargs))
+
+    def _send_call(self, code: str, segments: List[Any]) -> 'DenoObject':
+        '''
+        Assign result of the call to a tmp variable without waiting.
+        '''
+        variable = self._inter.make_remote_variable()
+        tmp_name = variable.name
+        self._inter.send(self._inter.command.make_call_command(tmp_name, code))
+        self._inter.flush()
+        result = self.__class__(name=code, code=tmp_name,
+                                interpreter=self._inter)
+        result._segments = segments + [variable]
+        return result
+
+    def _make_call(self, args: tuple,
+                   kwargs: dict) -> Tuple[str, List[Any]]:
+        '''
+        Make code to call this function and segments used by it.
+        Tmp variables used by the code are kept with segments.
+        '''
+        segments: List[Any] = list(self._segments)
+        for arg in (*args, *kwargs.values()):
+            if isinstance(arg, DenoObject):
+                segments.extend(arg._segments)
         code_args = ",".join(
             arg._code if isinstance(arg, DenoObject)
-            else DenoObject._convert_to_interpreter(arg)
+            else DenoObject._convert_to_interpreter(arg, segments)
             for arg in args)
         code_kwargs = ",".join([
-            f'{key}={cast(DenoObject, kwargs[key]).code}'
+            f'{key}={cast(DenoObject, kwargs[key])._code}'
             if isinstance(kwargs[key], DenoObject)
-            else f'{key}={DenoObject._convert_to_interpreter(kwargs[key])}'
+            else f'{key}={DenoObject._convert_to_interpreter(kwargs[key], segments)}'
             for key in kwargs])
         if kwargs:
-            code = f'({self._code})({code_args}, {code_kwargs})'
-        else:
-            code = f'({self._code})({code_args})'
-        time_stamp = str(uuid.uuid1()).replace('-', '_')
-        tmp_name = self._inter.make_tmp_variable(time_stamp)
-        self._inter.send(f'try{{{tmp_name} = {code};}}catch(er){{{tmp_name}=er}}')
-        self._inter.flush()
-        return DenoObject(name=code, code=tmp_name, interpreter=self._inter)
-
-    def _operator(self, obj: Any, operator: str) -> 'DenoObject':
-        if not isinstance(obj, DenoObject):
-            obj = DenoObject._convert_to_interpreter(obj)
-        code = f'({self._code} {operator} {obj})'
-        time_stamp = str(uuid.uuid1()).replace('-', '_')
-        tmp_name = self._inter.make_tmp_variable(time_stamp)
-        # self._inter.send(f'try{{{tmp_name} = {code};}}catch(er){{{tmp_name}=er}}')
-        # self._inter.flush()
-        return DenoObject(name=code, code=tmp_name, interpreter=self._inter)
+            return f'({self._code})({code_args}, {code_kwargs})', segments
+        return f'({self._code})({code_args})', segments
 
     def __iadd__(self, obj: Any) -> 'InterpreterObject':
         return self._operator(obj, '+')
@@ -430,6 +901,9 @@ class DenoObject(InterpreterObject):
     def __div__(self, obj: Any) -> 'InterpreterObject':
         return self._operator(obj, '/')
 
+    def __truediv__(self, obj: Any) -> 'InterpreterObject':
+        return self._operator(obj, '/')
+
     def __idiv__(self, obj: Any) -> 'InterpreterObject':
         return self._operator(obj, '/')
 
@@ -464,31 +938,149 @@ class DenoObject(InterpreterObject):
         return self._operator(obj, '!==')
 
     def __getitem__(self, key: str) -> Any:
+        if self._lazy is not None:
+            return self._make_lazy(Expr('item', key, (self._lazy,)),
+                                   list(self._segments))
         code = f'{self._code}["{key}"]'
-        return DenoObject(name=code, code=code, interpreter=self._inter)
+        result = DenoObject(name=code, code=code, interpreter=self._inter)
+        result._segments = list(self._segments)
+        return result
 
     def __setitem__(self, key: str, obj: Any) -> None:
-        code = f'{self._code}["{key}"] = {self._convert_to_interpreter(obj)}'
-        self._inter.send(code)
+        self._inter.send(self._make_setitem(key, obj))
+
+    def _make_setitem(self, key: str, obj: Any) -> str:
+        '''
+        Make code to set item and invalidate metadata of this object.
+        '''
+        self._inter.metadata.invalidate(self._name)
+        self._inter.metadata.invalidate(self._code)
+        return (f'{self._code}["{key}"] = '
+                f'{self._convert_to_interpreter(obj, self._segments)}')
 
     def __setattr__(self, key, obj) -> None:
         InterpreterObject.__setattr__(self, key, obj)
 
 
+@RObject.converters.register('pandas.DataFrame')
+@RObject.converters.register('pandas.core.frame.DataFrame')
+def _dataframe_to_r(obj: 'pd.DataFrame',
+                    segments: Optional[List[transport.Segment]]) -> str:
+    from . import frame
+    segment = transport.own(transport.Segment(), segments)
+    frame.write_frame(obj, segment.path)
+    return f'.ninter$read_frame("{segment.path}")'
+
+
+@RObject.converters.register('numpy.ndarray')
+def _ndarray_to_r(obj: 'np.ndarray',
+                  segments: Optional[List[transport.Segment]]) -> str:
+    '''
+    ndarray is passed as binary and R sets dim if it has 2 or more axes.
+    '''
+    inter_type = transport.r_type(obj)
+    if obj.ndim == 0 or inter_type is None:
+        return RObject._convert_to_interpreter(obj.tolist(), segments)
+    segment = transport.own(transport.Segment(), segments)
+    has_na = transport.write_vector(segment.path, obj, inter_type)
+    dim = ', '.join(str(n) for n in obj.shape)
+    return (f'.ninter$read_array("{segment.path}", "{inter_type}", '
+            f'{obj.size}, c({dim}), {"TRUE" if has_na else "FALSE"})')
+
+
+@RObject.converters.register('numpy.generic')
+def _numpy_scalar_to_r(obj: 'np.generic',
+                       segments: Optional[List[transport.Segment]]) -> str:
+    return RObject._convert_to_interpreter(obj.item(), segments)
+
+
+@RObject.converters.register('pyarrow.lib.Table')
+def _arrow_to_r(obj: Any, segments: Optional[List[transport.Segment]]) -> str:
+    return _dataframe_to_r(obj.to_pandas(), segments)
+
+
+@DenoObject.converters.register('pandas.DataFrame')
+@DenoObject.converters.register('pandas.core.frame.DataFrame')
+def _dataframe_to_deno(obj: 'pd.DataFrame',
+                       segments: Optional[List[transport.Segment]]) -> str:
+    '''
+    DataFrame becomes an array of records.
+    '''
+    return DenoObject._convert_to_interpreter(
+        json.loads(obj.to_json(orient='records')), segments)
+
+
+@DenoObject.converters.register('numpy.ndarray')
+def _ndarray_to_deno(obj: 'np.ndarray',
+                     segments: Optional[List[transport.Segment]]) -> str:
+    '''
+    Numeric ndarray becomes TypedArray.
+    If it has 2 or more axes, it becomes nested arrays of TypedArray
+    which share one buffer.
+    Masked array and other dtypes are passed as JSON.
+    '''
+    import numpy as np
+    typed_array = transport.DENO_TYPED_ARRAYS.get(obj.dtype.str[1:])
+    if obj.ndim == 0 or typed_array is None or np.ma.isMaskedArray(obj):
+        return DenoObject._convert_to_interpreter(obj.tolist(), segments)
+    values = np.ascontiguousarray(
+        obj, dtype=transport.DENO_DTYPES[typed_array])
+    if values.nbytes > transport.threshold:
+        segment = transport.own(transport.Segment(values), segments)
+        source = f'"{segment.path}"'
+    else:
+        source = json.dumps(values.ravel().tolist())
+    return (f'PythonObjects.ninterArray({source}, {typed_array}, '
+            f'{list(obj.shape)})')
+
+
+@DenoObject.converters.register('numpy.generic')
+def _numpy_scalar_to_deno(obj: 'np.generic',
+                          segments: Optional[List[transport.Segment]]) -> str:
+    return DenoObject._convert_to_interpreter(obj.item(), segments)
+
+
 class R(Interpreter):
-    def __init__(self) -> None:
+    '''
+    R interpreter.
+    If spares are kept by warm.keep_warm(RCommand),
+    one of them is used instead of starting new one.
+    If server is True, it runs RPC server by Rscript instead of REPL.
+    See RServerCommand.
+    If thread_safe is True, threads can share it. See start_reader.
+    '''
+
+    def __init__(self, framed: bool = False, server: bool = False,
+                 thread_safe: bool = False) -> None:
+        command_class = RServerCommand if server else RCommand
         super().__init__(
-            RCommand(),
+            warm.take(command_class, framed=framed)
+            or command_class(framed=framed),
             RObject
         )
+        if thread_safe:
+            self.start_reader()
 
 
 class Deno(Interpreter):
-    def __init__(self) -> None:
+    '''
+    Deno interpreter.
+    Spares are used like R.
+    If server is True, it runs RPC server instead of REPL.
+    See DenoServerCommand.
+    If thread_safe is True, threads can share it. See start_reader.
+    '''
+
+    def __init__(self, framed: bool = False, server: bool = False,
+                 thread_safe: bool = False) -> None:
+        command_class = DenoServerCommand if server else DenoCommand
         super().__init__(
-            DenoCommand(),
+            warm.take(command_class, framed=framed)
+            or command_class(framed=framed),
             DenoObject
         )
+        if thread_safe:
+            self.start_reader()
 
 
 def get_code(obj: InterpreterObject) -> str:
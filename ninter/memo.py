@@ -0,0 +1,165 @@
+'''
+Memoization of calls of functions in other interpreters.
+Statistical functions like t.test are often called with same arguments.
+Memoized caches results by the code of the call,
+and so, the key is the code of the function and the encoded arguments.
+Big arguments are passed by segments whose paths are random,
+and the paths are replaced by hash of their content.
+
+>>> t_test = r['t.test'].memoize(maxsize=256, ttl=600)
+>>> t_test(x, y)  # Computed by R.
+>>> t_test(x, y)  # The same handle is returned.
+
+Functions should be pure. If the function or a remote argument
+was changed in the interpreter, call clear.
+'''
+from typing import Any, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import math
+import sys
+import time
+
+# Default of CallCache.get.
+MISSING = object()
+
+
+def content_hash(code: str, segments: List[Any]) -> str:
+    '''
+    Hash of code of a call.
+    Paths of segments in the code are replaced by hash of their content.
+    '''
+    for segment in segments:
+        path = getattr(segment, 'path', None)
+        if path is None or path not in code:
+            continue
+        file_digest = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                file_digest.update(block)
+        code = code.replace(path, file_digest.hexdigest())
+    return hashlib.blake2b(code.encode(), digest_size=20).hexdigest()
+
+
+def size_of(value: Any) -> int:
+    '''
+    Bytes of python value roughly.
+    '''
+    if hasattr(value, 'memory_usage'):
+        # DataFrame returns Series and Series returns int.
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class CallCache:
+    '''
+    LRU cache with time to live and limit of total bytes.
+
+    maxsize: int
+        Number of entries.
+    ttl: float
+        Seconds while an entry is valid. None means forever.
+    max_bytes: int
+        Limit of sum of bytes of entries. None means no limit.
+    '''
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # key -> (expiry, bytes, value). Recently used one is the last.
+        self.entries: 'OrderedDict[str, Tuple[float, int, Any]]' = \
+            OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._pop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key: str, value: Any, nbytes: int = 0) -> None:
+        '''
+        Old entries are evicted until it fits the limits.
+        A value bigger than max_bytes is not cached.
+        '''
+        if key in self.entries:
+            self._pop(key)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        expiry = math.inf if self.ttl is None else time.monotonic() + self.ttl
+        self.entries[key] = (expiry, nbytes, value)
+        self.bytes += nbytes
+        while len(self.entries) > self.maxsize or (
+                self.max_bytes is not None and self.bytes > self.max_bytes):
+            self._pop(next(iter(self.entries)))
+
+    def _pop(self, key: str) -> None:
+        _, nbytes, _ = self.entries.pop(key)
+        self.bytes -= nbytes
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+
+
+class Memoized:
+    '''
+    Function of other interpreter with CallCache.
+    It is made by InterpreterObject.memoize.
+
+    If to_python is False, handles of results are cached
+    and their tmp variables live while they are cached.
+    to_python of the handles reads the tmp variables
+    and it does not run the function again.
+    If to_python is True, results are converted to python values
+    and they are cached. max_bytes limits sum of their sizes.
+    '''
+
+    def __init__(self, function: Any, maxsize: int = 128,
+                 ttl: Optional[float] = None, to_python: bool = False,
+                 max_bytes: Optional[int] = None) -> None:
+        self.function = function
+        self.to_python = to_python
+        self.cache = CallCache(maxsize, ttl, max_bytes)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        '''
+        Arguments are same as the function.
+        '''
+        # RObject takes keyword arguments as a dict named kwargs.
+        if set(kwargs) == {'kwargs'}:
+            kwargs = kwargs['kwargs']
+        function = self.function
+        code, segments = function._make_call(args, kwargs)
+        key = content_hash(code, segments)
+        value = self.cache.get(key, MISSING)
+        if value is not MISSING:
+            function._inter._count('memo_hit')
+            return value
+        function._inter._count('call')
+        result = function._send_call(code, segments)
+        if not self.to_python:
+            self.cache.set(key, result)
+            return result
+        value = result.to_python()
+        self.cache.set(key, value, size_of(value))
+        return value
+
+    def clear(self) -> None:
+        self.cache.clear()
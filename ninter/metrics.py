@@ -0,0 +1,166 @@
+'''
+Instrumentation of interpreters.
+It is off by default and the cost is just checking None.
+Interpreter.instrument turns it on.
+
+>>> r = R()
+>>> metrics = r.instrument()
+>>> r['x'] = [1, 2, 3]
+>>> print(metrics.export())  # Prometheus text format.
+
+Timings of a request are split like below.
+- encode: python object -> code of the interpreter
+- write: writing and flushing the pipe
+- wait: blocked on the pipe until the interpreter answers
+- read: receiving the response except wait
+- decode: response -> python object
+'''
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from contextlib import contextmanager
+from bisect import bisect_left
+import math
+import os
+import time
+
+# Upper bounds of buckets of histograms in seconds.
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05,
+           0.1, 0.5, 1.0, 5.0, math.inf)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (kind, name, value, labels). kind is counter, gauge or histogram.
+Hook = Callable[[str, str, float, Dict[str, str]], None]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    '''
+    Counters, gauges and histograms with labels.
+    Hooks are called with every observation.
+    One Metrics can be shared by some interpreters.
+    '''
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.hooks: List[Hook] = []
+
+    def add_hook(self, hook: Hook) -> None:
+        self.hooks.append(hook)
+
+    def _call_hooks(self, kind: str, name: str, value: float,
+                    labels: Dict[str, str]) -> None:
+        for hook in self.hooks:
+            hook(kind, name, value, labels)
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+        if self.hooks:
+            self._call_hooks('counter', name, value, labels)
+
+    def gauge(self, name: str, value: float, **labels: str) -> None:
+        self.gauges[name, tuple(sorted(labels.items()))] = value
+        if self.hooks:
+            self._call_hooks('gauge', name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+        if self.hooks:
+            self._call_hooks('histogram', name, value, labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        '''
+        Observe seconds of the block.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def export(self) -> str:
+        '''
+        Make text of Prometheus exposition format.
+        '''
+        lines: List[str] = []
+        typed: set = set()
+
+        def head(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(self.counters.items()):
+            head(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+        for (name, labels), value in sorted(self.gauges.items()):
+            head(name, 'gauge')
+            lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+        for (name, labels), histogram in sorted(self.histograms.items(),
+                                                key=lambda item: item[0]):
+            head(name, 'histogram')
+            total = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                total += count
+                bucket_labels = labels + (('le', _number(bound)),)
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)}'
+                             f' {total}')
+            lines.append(f'{name}_sum{_format_labels(labels)} '
+                         f'{_number(histogram.sum)}')
+            lines.append(f'{name}_count{_format_labels(labels)} '
+                         f'{histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        '''
+        Write the text to the path atomically,
+        for example, for textfile collector of node exporter.
+        '''
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.export())
+        os.replace(tmp_path, path)
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+         .replace('\n', '\\n'))
+        for key, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def type_label(obj: Any) -> str:
+    '''
+    Label of conversion path from python.
+    '''
+    return type(obj).__name__
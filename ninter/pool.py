@@ -0,0 +1,145 @@
+'''
+Pool of interpreters.
+One interpreter is a single threaded process,
+and so, it uses only one core.
+InterpreterPool starts some interpreters and
+runs calls on idle ones in parallel.
+
+>>> from ninter import R
+>>> from ninter.pool import InterpreterPool
+>>> setup = 'p_value <- function(x) t.test(x)$p.value'
+>>> with InterpreterPool(R, size=4, setup=setup) as pool:
+...     p_values = pool.map('p_value', samples)
+'''
+from typing import Any, Callable, Iterable, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue
+import os
+from .base import Interpreter, InterpreterClosed
+
+
+class InterpreterPool:
+    '''
+    Pool of interpreters which dispatches calls to idle interpreters.
+    Each interpreter runs one call at a time and
+    the next call goes to the interpreter which became idle first.
+
+    interpreter: Callable
+        Function to make Interpreter, for example, R or Deno.
+    size: int
+        Number of interpreters. The default is number of cores.
+    setup: str
+        Code run on each interpreter when it started,
+        for example, library() calls or definition of functions.
+    '''
+
+    def __init__(self, interpreter: Callable[[], Interpreter],
+                 size: Optional[int] = None, setup: str = '') -> None:
+        self.interpreter = interpreter
+        self.size = size if size else (os.cpu_count() or 1)
+        self.setup = setup
+        self.restarts = 0
+        self.workers: List[Interpreter] = []
+        self._idle: Queue = Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+        # Interpreters are started in parallel.
+        for worker in self._executor.map(
+                lambda _: self._start(), range(self.size)):
+            self.workers.append(worker)
+            self._idle.put(worker)
+
+    def __enter__(self) -> 'InterpreterPool':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _start(self) -> Interpreter:
+        '''
+        Start an interpreter and run setup code on it.
+        '''
+        worker = self.interpreter()
+        if self.setup:
+            worker.get(self.setup)
+        return worker
+
+    def _restart(self, worker: Interpreter) -> Interpreter:
+        '''
+        Replace crashed interpreter by new one.
+        '''
+        try:
+            worker.command.inter.kill()
+            worker.command.inter.wait()
+        except OSError:
+            pass
+        new_worker = self._start()
+        self.workers[self.workers.index(worker)] = new_worker
+        self.restarts += 1
+        return new_worker
+
+    def _is_alive(self, worker: Interpreter) -> bool:
+        return worker.command.inter.poll() is None
+
+    def _run(self, function: str, args: tuple, kwargs: dict) -> Any:
+        worker = self._idle.get()
+        try:
+            code, segments = worker[function]._make_call(args, kwargs)
+            result = worker.ObjectClass(name=code, interpreter=worker)
+            result._segments = segments
+            return result.to_python()
+        except (InterpreterClosed, OSError):
+            if not self._is_alive(worker):
+                worker = self._restart(worker)
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def submit(self, function: str, *args: Any,
+               kwargs: dict = {}) -> Future:
+        '''
+        Call a function on an idle interpreter.
+        The function is a name or code of function in the interpreter.
+        Arguments should be python objects.
+        It returns concurrent.futures.Future of the result.
+        '''
+        return self._executor.submit(self._run, function, args, kwargs)
+
+    def map(self, function: str, iterable: Iterable[Any]) -> List[Any]:
+        '''
+        Call a function with each item of iterable in parallel.
+        Results are returned in order.
+        '''
+        futures = [self.submit(function, arg) for arg in iterable]
+        return [future.result() for future in futures]
+
+    def starmap(self, function: str, iterable: Iterable[tuple]) -> List[Any]:
+        '''
+        Same as map, but each item is a tuple of arguments.
+        '''
+        futures = [self.submit(function, *args) for args in iterable]
+        return [future.result() for future in futures]
+
+    def check(self) -> int:
+        '''
+        Health check of idle interpreters.
+        Crashed interpreters are restarted.
+        It returns number of restarted interpreters.
+        '''
+        restarts = self.restarts
+        for _ in range(self._idle.qsize()):
+            worker = self._idle.get()
+            try:
+                if not self._is_alive(worker):
+                    raise InterpreterClosed('Interpreter was closed.')
+                worker.get('1')
+            except (InterpreterClosed, OSError):
+                worker = self._restart(worker)
+            finally:
+                self._idle.put(worker)
+        return self.restarts - restarts
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        for worker in self.workers:
+            if self._is_alive(worker):
+                worker.close()
@@ -0,0 +1,157 @@
+// RPC server of ninter for Deno.
+// DenoServerCommand runs it instead of REPL.
+// Requests and responses are frames like below.
+//   \x02ninter <id> <operation or status> <byte length>\n<body>
+// Operations are
+//   eval    body is code. Output of console.log and the value return.
+//   get     body is "<path> <threshold> <min_numbers>\n<code>".
+//           The value is written by PythonObjects.ninterFetch.
+//   set     body is "<name>\n<code>". The value is assigned to the name,
+//           which may be like "a[0]".
+//   call    body is "<name>\n<code>". The value or the error is set.
+//   delete  body is names separated by spaces.
+// Status of responses is ok or error.
+// Code is evaluated by indirect eval in global scope,
+// and so, 'let' and 'const' in it do not live after the request.
+// Use 'var' or globalThis to keep variables.
+
+const HEAD = "\x02ninter ";
+const encoder = new TextEncoder();
+const decoder = new TextDecoder();
+const evaluate = eval;
+
+// Output of console.log while a request is handled.
+let output = [];
+console.log = (...args) => {
+  output.push(
+    args.map((a) => typeof a === "string" ? a : Deno.inspect(a)).join(" ") +
+      "\n",
+  );
+};
+
+// Names may be like 'a[0]' or 'PythonObjects.py1',
+// and so, code of the assignment is evaluated.
+function assign(name, value) {
+  PythonObjects.ninterValue = value;
+  try {
+    evaluate(`${name} = PythonObjects.ninterValue`);
+  } finally {
+    delete PythonObjects.ninterValue;
+  }
+}
+
+function remove(name) {
+  evaluate(`delete ${name}`);
+}
+
+// Split the first line of the body.
+function splitHead(body) {
+  const index = body.indexOf("\n");
+  return [body.slice(0, index), body.slice(index + 1)];
+}
+
+function handle(operation, body) {
+  switch (operation) {
+    case "eval": {
+      const value = evaluate(body);
+      if (value !== undefined) {
+        output.push(Deno.inspect(value) + "\n");
+      }
+      break;
+    }
+    case "get": {
+      const [head, code] = splitHead(body);
+      const [path, threshold, minNumbers] = head.split(" ");
+      try {
+        PythonObjects.ninterFetch(
+          evaluate(code),
+          path,
+          Number(threshold),
+          Number(minNumbers),
+        );
+      } catch (e) {
+        console.log("JS error:", e);
+      }
+      break;
+    }
+    case "set": {
+      const [name, code] = splitHead(body);
+      // Parentheses make an object literal not a block.
+      assign(name, evaluate(`(${code}\n)`));
+      break;
+    }
+    case "call": {
+      const [name, code] = splitHead(body);
+      let value;
+      try {
+        value = evaluate(code);
+      } catch (e) {
+        value = e;
+      }
+      assign(name, value);
+      break;
+    }
+    case "delete":
+      for (const name of body.split(" ")) {
+        if (name) remove(name);
+      }
+      break;
+    default:
+      throw new Error(`Unknown operation: ${operation}`);
+  }
+}
+
+function respond(id, status, text) {
+  const body = encoder.encode(text);
+  const head = encoder.encode(`${HEAD}${id} ${status} ${body.length}\n`);
+  const data = new Uint8Array(head.length + body.length);
+  data.set(head);
+  data.set(body, head.length);
+  let n = 0;
+  while (n < data.length) {
+    n += Deno.stdout.writeSync(data.subarray(n));
+  }
+}
+
+// Handle frames in the buffer and return number of used bytes.
+function handleFrames(buffer) {
+  let start = 0;
+  while (true) {
+    const end = buffer.indexOf(10, start);
+    if (end === -1) break;
+    const head = decoder.decode(buffer.subarray(start, end));
+    const [id, operation, size] = head.slice(HEAD.length).split(" ");
+    const bodyStart = end + 1;
+    const bodyEnd = bodyStart + Number(size);
+    if (bodyEnd > buffer.length) break;
+    const body = decoder.decode(buffer.subarray(bodyStart, bodyEnd));
+    start = bodyEnd;
+    output = [];
+    try {
+      handle(operation, body);
+      respond(id, "ok", output.join(""));
+    } catch (e) {
+      respond(id, "error", output.join("") + `Uncaught ${e}\n`);
+    }
+  }
+  return start;
+}
+
+// The buffer grows twice when it is full.
+let buffer = new Uint8Array(1 << 16);
+let length = 0;
+while (true) {
+  if (length === buffer.length) {
+    const bigger = new Uint8Array(buffer.length * 2);
+    bigger.set(buffer);
+    buffer = bigger;
+  }
+  const n = await Deno.stdin.read(buffer.subarray(length));
+  if (n === null) break;
+  length += n;
+  const used = handleFrames(buffer.subarray(0, length));
+  if (used) {
+    buffer.copyWithin(0, used, length);
+    length -= used;
+  }
+}
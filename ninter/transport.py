@@ -0,0 +1,247 @@
+'''
+Binary transport between python and other interpreters.
+Printing a big vector and parsing it again is slow and
+it loses precision.
+Instead, the other interpreter writes raw bytes into a file
+and python reads them as numpy array.
+
+Files are put in /dev/shm if it is available,
+and so, they are segments of shared memory in practice.
+Big payloads are passed as segments and only the path
+goes through the pipe.
+'''
+from typing import Any, BinaryIO, Dict, List, Optional
+import mmap
+import struct
+import os
+import tempfile
+import uuid
+import weakref
+
+# Payloads bigger than this (bytes) go through segments
+# instead of the pipe.
+threshold = 1 << 16
+
+# Segments made without owner. They are removed when python exits.
+unowned: List['Segment'] = []
+
+# typeof() in R -> dtype of numpy.
+R_DTYPES: Dict[str, str] = {
+    'double': '<f8',
+    'integer': '<i4',
+    'logical': '|b1',
+    'complex': '<c16',
+}
+
+# dtype of numpy -> TypedArray of Javascript.
+# 64 bit integers become numbers as JSON does.
+DENO_TYPED_ARRAYS: Dict[str, str] = {
+    'f8': 'Float64Array',
+    'f4': 'Float32Array',
+    'f2': 'Float32Array',
+    'i1': 'Int8Array',
+    'i2': 'Int16Array',
+    'i4': 'Int32Array',
+    'i8': 'Float64Array',
+    'u1': 'Uint8Array',
+    'u2': 'Uint16Array',
+    'u4': 'Uint32Array',
+    'u8': 'Float64Array',
+}
+
+# TypedArray -> dtype of numpy.
+DENO_DTYPES: Dict[str, str] = {
+    'Float64Array': '<f8',
+    'Float32Array': '<f4',
+    'Float16Array': '<f2',
+    'Int8Array': '|i1',
+    'Int16Array': '<i2',
+    'Int32Array': '<i4',
+    'BigInt64Array': '<i8',
+    'Uint8Array': '|u1',
+    'Uint8ClampedArray': '|u1',
+    'Uint16Array': '<u2',
+    'Uint32Array': '<u4',
+    'BigUint64Array': '<u8',
+}
+
+
+def segment_dir() -> str:
+    '''
+    Directory to put segments.
+    /dev/shm is used if it is available.
+    '''
+    if os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def make_buffer_path() -> str:
+    '''
+    Make a path of a file to put binary data.
+    The file should be removed by read_buffer.
+    '''
+    return os.path.join(segment_dir(), f'ninter_{uuid.uuid4().hex}.bin')
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Segment:
+    '''
+    A file to pass bytes to other interpreter.
+    The file is removed when this object is released,
+    and so, objects which use it must keep reference of it.
+    '''
+
+    def __init__(self, data: Any = None) -> None:
+        self.path = make_buffer_path()
+        self._finalizer = weakref.finalize(self, _remove, self.path)
+        if data is not None:
+            with open(self.path, 'wb') as f:
+                f.write(data)
+
+    def release(self) -> None:
+        '''
+        Remove the file now.
+        '''
+        self._finalizer()
+
+
+def own(segment: Segment, segments: Optional[List[Segment]]) -> Segment:
+    '''
+    Append segment to the list of owner.
+    If there is no owner, it lives until python exits.
+    '''
+    (unowned if segments is None else segments).append(segment)
+    return segment
+
+
+def read_buffer(path: str) -> Any:
+    '''
+    Read whole of a binary file and remove it.
+    Big file is mapped by mmap and it is not copied.
+    It returns writable buffer.
+    '''
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            if size >= threshold:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            buffer = bytearray(size)
+            f.readinto(buffer)
+            return buffer
+    finally:
+        _remove(path)
+
+
+def read_strings(buffer: Any) -> List[str]:
+    '''
+    Read strings written by '.ninter$write_strings'.
+    They are int32 count, int32 byte length
+    and NUL terminated UTF-8 strings.
+    '''
+    count, nbytes = struct.unpack_from('<ii', buffer)
+    block = bytes(buffer[8:8 + nbytes])
+    return block.decode().split('\0')[:count]
+
+
+def write_strings(f: BinaryIO, strings: List[str]) -> None:
+    block = ''.join(s + '\0' for s in strings).encode()
+    f.write(struct.pack('<ii', len(strings), len(block)))
+    f.write(block)
+
+
+def r_type(array: Any) -> Optional[str]:
+    '''
+    typeof() in R for dtype of numpy array.
+    Integers out of range of R integer become double.
+    It returns None if the dtype is not supported.
+    '''
+    kind = array.dtype.kind
+    if kind == 'b':
+        return 'logical'
+    elif kind == 'f':
+        return 'double'
+    elif kind == 'c':
+        return 'complex'
+    elif kind in 'iu':
+        # -2 ** 31 is NA in R.
+        if (array.dtype.itemsize < 4 or array.size == 0
+                or (array.min() > -2 ** 31 and array.max() < 2 ** 31)):
+            return 'integer'
+        return 'double'
+    elif kind in 'USO':
+        return 'character'
+    return None
+
+
+def write_vector(path: str, array: Any, inter_type: str) -> bool:
+    '''
+    Write numpy array in column major order for '.ninter$read_array'.
+    Masked values become NA and the mask follows the values.
+    It returns whether NA mask was written.
+    '''
+    import numpy as np
+    mask = np.ma.getmaskarray(array) if np.ma.isMaskedArray(array) else None
+    has_na = mask is not None and bool(mask.any())
+    values = np.ma.getdata(array)
+    with open(path, 'wb') as f:
+        if inter_type == 'character':
+            write_strings(f, [
+                value.decode() if isinstance(value, bytes) else str(value)
+                for value in values.ravel(order='F')])
+        else:
+            dtype = '|u1' if inter_type == 'logical' else R_DTYPES[inter_type]
+            # Transposed Fortran array is C contiguous and it is not copied.
+            f.write(np.asfortranarray(values, dtype=dtype).T)
+        if has_na:
+            f.write(np.asfortranarray(mask, dtype='|u1').T)
+    return has_na
+
+
+def decode_typed_array(buffer: Any, array_type: str, length: int) -> Any:
+    '''
+    Make numpy array from raw bytes of TypedArray of Javascript.
+    '''
+    import numpy as np
+    return np.frombuffer(buffer, dtype=DENO_DTYPES[array_type], count=length)
+
+
+def decode_vector(buffer: Any, inter_type: str,
+                  length: int, n_na: int, scalar: bool = True) -> Any:
+    '''
+    Make numpy array from raw bytes of R vector.
+    Integer and logical vector may have NA mask after the values.
+    In that case, masked array is returned.
+    Doubles and complexes keep NA as NaN.
+
+    buffer: bytes like object
+        Raw values and NA mask.
+    inter_type: str
+        Result of typeof() in R.
+    length: int
+        Length of the vector.
+    n_na: int
+        Number of NA. If it is not 0, mask follows the values.
+    scalar: bool
+        If it is True and length is 1, python scalar is returned.
+    ====================
+    Returns numpy.ndarray, or python scalar.
+    '''
+    import numpy as np
+    dtype = np.dtype(R_DTYPES[inter_type])
+    values = np.frombuffer(buffer, dtype=dtype, count=length)
+    if n_na:
+        mask = np.frombuffer(buffer, dtype=np.bool_, count=length,
+                             offset=length * dtype.itemsize)
+        values = np.ma.masked_array(values, mask=mask)
+    if scalar and length == 1:
+        if n_na:
+            return None
+        return values[0].item()
+    return values
@@ -0,0 +1,141 @@
+'''
+Spare interpreters started in background.
+Starting R with packages takes seconds.
+keep_warm starts some interpreters before they are needed,
+and R(), Deno(), start_r() and start_deno() take one of them.
+When a spare is taken, a new one is started in background.
+
+>>> from ninter import R, warm
+>>> from ninter.interpreter import RCommand
+>>> warm.keep_warm(RCommand, size=2, bootstrap='library(stats)')
+>>> r = R()  # It does not wait for starting R.
+'''
+from typing import Callable, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+import atexit
+import threading
+from .base import Command
+
+# (Command class, framed) -> spares.
+spares: Dict[Tuple[type, bool], 'Spares'] = {}
+
+
+class Spares:
+    '''
+    Queue of started commands.
+    Each spare is started and the bootstrap code was run on it.
+    If starting a spare failed, the exception is queued instead
+    and it is raised by take.
+
+    make_command: Callable
+        Function to make a command which is not started.
+    size: int
+        Number of spares.
+    bootstrap: str
+        Code run on each spare after it started.
+    '''
+
+    def __init__(self, make_command: Callable[[], Command],
+                 size: int = 1, bootstrap: str = '') -> None:
+        self.make_command = make_command
+        self.size = size
+        self.bootstrap = bootstrap
+        self.ready: Queue = Queue()
+        self.closed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size)
+        for _ in range(size):
+            self._refill()
+
+    def _start(self) -> None:
+        command = self.make_command()
+        try:
+            command.start(self.bootstrap)
+        except BaseException as er:
+            inter = getattr(command, 'inter', None)
+            if inter is not None:
+                inter.kill()
+                inter.wait()
+            self.ready.put(er)
+            return
+        self.ready.put(command)
+
+    def _refill(self) -> None:
+        with self._lock:
+            if not self.closed:
+                self._executor.submit(self._start)
+
+    def take(self) -> Command:
+        '''
+        Take a spare and start new one in background.
+        If no spare is ready, it waits for the one starting now.
+        Dead spares are thrown away.
+        If starting the spare failed, the exception is raised.
+        '''
+        while True:
+            if self.closed and self.ready.empty():
+                raise RuntimeError('Spares were closed.')
+            command = self.ready.get()
+            self._refill()
+            if isinstance(command, BaseException):
+                raise command
+            if command.inter.poll() is None:
+                return command
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+        self._executor.shutdown()
+        while not self.ready.empty():
+            # close of commands only makes code to quit.
+            command = self.ready.get()
+            if isinstance(command, BaseException):
+                continue
+            command.inter.terminate()
+            command.inter.wait()
+
+
+def keep_warm(command_class: type, size: int = 1,
+              bootstrap: str = '', framed: bool = False) -> None:
+    '''
+    Keep spares of the command class.
+    Spares are used only if framed is same.
+    If spares were kept already, they are replaced.
+
+    >>> keep_warm(RCommand, size=2, bootstrap='library(stats)')
+    >>> keep_warm(DenoCommand, framed=True)
+    '''
+    stop_warm(command_class, framed)
+    spares[command_class, framed] = Spares(
+        lambda: command_class(start=False, framed=framed), size, bootstrap)
+
+
+def take(command_class: type, framed: bool = False) -> Optional[Command]:
+    '''
+    Take a started command if spares are kept.
+    Otherwise, it returns None.
+    '''
+    spare = spares.get((command_class, framed))
+    if spare is None:
+        return None
+    return spare.take()
+
+
+def stop_warm(command_class: Optional[type] = None,
+              framed: bool = False) -> None:
+    '''
+    Stop spares of the command class.
+    If command class is not given, all of spares are stopped.
+    '''
+    if command_class is None:
+        keys = list(spares)
+    else:
+        keys = [(command_class, framed)]
+    for key in keys:
+        spare = spares.pop(key, None)
+        if spare is not None:
+            spare.close()
+
+
+atexit.register(stop_warm)
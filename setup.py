@@ -6,6 +6,10 @@ setup(
     install_requires=['pandas', 'numpy'],
     # package_dir={'ninwavelets': 'ninwavelets'},
     packages=find_packages(),
+    package_data={'ninter': ['*.R', '*.js']},
+    entry_points={
+        'console_scripts': ['ninter-bench = ninter.bench.__main__:main'],
+    },
     description='User friendly pipe between python and other interpreters.',
     long_description='''User friendly pipe between python, R and Deno.
     The code can be written like python code.''',
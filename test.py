@@ -4,9 +4,20 @@ This is... just my hobby and may not be a good test code.
 """
 from ninter.interpreter import (RCommand, RObject, DenoObject,
                          DenoCommand, Interpreter, InterpreterException,
-                         )
+                         DenoServerCommand, RServerCommand)
+import numpy as np
 import pandas as pd
-from ninter import Deno, R, Bridge, Let, Const
+from ninter import Deno, R, Bridge, Let, Const, AsyncDeno
+from ninter.pool import InterpreterPool
+from ninter import keep_warm, stop_warm, warm
+from ninter.base import ChunkReader, MetadataCache, InterpreterClosed, InterpreterTimeout
+from ninter.memo import CallCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import subprocess
+import sys
+import time
 import unittest
 from logging import basicConfig, ERROR
 basicConfig(level=ERROR)
@@ -51,6 +62,18 @@ class RAssignString(RTestBase, AssignTestBase, unittest.TestCase):
     function = '''function (x) { return (paste(x, 'fuga', sep='')) }'''
     result = 'hogefuga'
 
+class RServerTestBase:
+    def make_command(self):
+        return Interpreter(RServerCommand(), RObject)
+
+
+class RServerAssignNumber(RServerTestBase, AssignTestBase, unittest.TestCase):
+    send = 3
+    catch = 3.0
+    function = '''(function (x) { return (x * 2) })'''
+    result = 6.0
+
+
 class DenoTestBase:
     inter = Interpreter(DenoCommand(), DenoObject)
     def make_command(self):
@@ -69,6 +92,567 @@ class DenoAssignString(DenoTestBase, AssignTestBase, unittest.TestCase):
     function = '''(x) => { return x + "fuga" }'''
     result = 'hogefuga'
 
+class DenoServerTestBase:
+    def make_command(self):
+        return Interpreter(DenoServerCommand(), DenoObject)
+
+
+class DenoServerAssignNumber(DenoServerTestBase, AssignTestBase,
+                             unittest.TestCase):
+    send = 3
+    catch = 3
+    function = '''(x) => { return x * 2 }'''
+    result = 6
+
+
+class DenoServer(DenoServerTestBase, unittest.TestCase):
+    def test_operations(self) -> None:
+        inter = self.make_command()
+        inter['values'] = [1, 2, 3]
+        assert inter['values'].to_python() == [1, 2, 3]
+        assert inter.get('console.log(values.length)') == '3\n'
+        assert inter.get('missing()').startswith('Uncaught ReferenceError')
+        result = inter['Math.max'](*np.arange(5))
+        assert result.to_python() == 4
+        assert inter['values'].iter_chunks(rows=2).__next__().tolist() == [1, 2]
+        del result
+        assert inter.collect() == 1
+        inter.close()
+
+    def test_set_item(self) -> None:
+        inter = self.make_command()
+        inter['values'] = [1, 2, 3]
+        inter['values[0]'] = 5
+        inter['point'] = {'x': 1}
+        inter['point.x'] = 2
+        assert inter.fetch(['values', 'point']) == {
+            'values': [5, 2, 3], 'point': {'x': 2}}
+        assert 'values[0]' not in inter.get('Object.keys(globalThis)')
+        inter.close()
+
+    def test_call_once(self) -> None:
+        inter = self.make_command()
+        inter.get('globalThis.calls = 0; globalThis.make = (n) => '
+                  '{ calls++; return Array.from({length: n}, (_, i) => i) }')
+        result = inter['make'](4)
+        assert result.metadata()['length'] == 4
+        assert next(result.iter_chunks(rows=2)).tolist() == [0, 1]
+        assert result.to_python() == [0, 1, 2, 3]
+        assert result.to_numpy().tolist() == [0, 1, 2, 3]
+        assert DenoObject._submit_many(inter, [result]).result() == [
+            [0, 1, 2, 3]]
+        assert inter['calls'].to_python() == 1
+        inter.close()
+
+
+class RServer(RServerTestBase, unittest.TestCase):
+    def test_operations(self) -> None:
+        inter = self.make_command()
+        inter['frame'] = pd.DataFrame({'a': [1, 2]})
+        inter['frame$b'] = [3, 4]
+        assert inter['names(frame)'].to_python() == ['a', 'b']
+        assert inter.get('1 + 1; 2 + 2').split() == ['[1]', '2', '[1]', '4']
+        with self.assertRaises(InterpreterException) as caught:
+            inter['t.test']().to_python()
+        assert ('Error in t.test.default() : argument "x" is missing'
+                in str(caught.exception))
+        inter.close()
+        assert inter.command.inter.poll() is not None
+
+
+class DenoSegment(DenoTestBase, unittest.TestCase):
+    def test_big_payload(self) -> None:
+        inter = self.make_command()
+        inter.let('big', list(range(20000)))
+        assert inter['big'].to_python() == list(range(20000))
+        assert inter['Array'](*range(3)).to_python() == [0, 1, 2]
+        inter.close()
+
+
+class DenoMetadata(DenoTestBase, unittest.TestCase):
+    def test_cache(self) -> None:
+        inter = self.make_command()
+        inter.let('meta', [1, 2])
+        assert inter['meta'].metadata()['length'] == 2
+        assert inter['meta'].metadata()['is_array']
+        assert inter.metadata.hits == 1
+        inter['meta'] = {'a': 1}
+        assert inter['meta'].metadata()['names'] == ['a']
+        assert inter.metadata.misses == 2
+        inter.close()
+
+    def test_lru(self) -> None:
+        cache = MetadataCache(maxsize=5)
+        for name in ['x', 'x$a', 'x[[1]]', 'names(x)', '(x + 1)', 'xy']:
+            cache.set(name, {'name': name})
+        assert cache.get('x') is None
+        cache.set('x', {})
+        cache.set('f(xy, y_x)', {})
+        cache.invalidate('x')
+        assert list(cache.data) == ['xy', 'f(xy, y_x)']
+
+
+class DenoLazy(DenoTestBase, unittest.TestCase):
+    def test_lazy(self) -> None:
+        inter = self.make_command()
+        inter.let('x', 3)
+        inter.let('o', {'a': 5})
+        x = inter['x']
+        s = x + inter['o']['a']
+        result = (s * s - x) / 2
+        # The sum is evaluated once in the expression.
+        assert result._code.count('(x + o["a"])') == 1
+        assert result.to_python() == 30.5
+        chain = x
+        for _ in range(1000):
+            chain = chain + 1
+        assert chain.to_python() == 1003
+        assert (x == 3).to_python() is True
+        inter.close()
+
+
+class DenoCollect(DenoTestBase, unittest.TestCase):
+    def test_collect(self) -> None:
+        inter = self.make_command()
+        count = 'console.log(Object.keys(PythonObjects).filter((key) => key.startsWith("py")).length)'
+        results = [inter['Array'](1, 2) for _ in range(10)]
+        length = results[0]['length']
+        assert inter.live_objects == 10
+        del results
+        # The item keeps the variable of its parent.
+        assert inter.live_objects == 1
+        assert inter.collect() == 9
+        assert inter.get(count).strip() == '1'
+        assert length.to_python() == 2
+        del length
+        assert inter.collect() == 1
+        assert inter.get(count).strip() == '0'
+        inter.close()
+
+
+class DenoConverter(DenoTestBase, unittest.TestCase):
+    def test_converter(self) -> None:
+        inter = self.make_command()
+        inter.let('records', pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']}))
+        assert inter['records'].to_python() == [
+            {'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}]
+
+        class Point:
+            def __init__(self, x: int, y: int) -> None:
+                self.x, self.y = x, y
+        name = f'{__name__}.{Point.__qualname__}'
+        DenoObject.converters.register(name)(
+            lambda point, segments: f'[{point.x}, {point.y}]')
+        try:
+            assert inter['Array.from'](Point(3, 7)).to_python() == [3, 7]
+        finally:
+            del DenoObject.converters.converters[name]
+        inter.close()
+
+
+class NumpyInput(DenoTestBase, unittest.TestCase):
+    def test_r_code(self) -> None:
+        assert RObject._convert_to_interpreter((1,)) == 'c(1)'
+        assert RObject._convert_to_interpreter([True, 'a']) == 'c(TRUE, "a")'
+        segments: list = []
+        code = RObject._convert_to_interpreter(
+            np.arange(6).reshape(2, 3), segments)
+        assert code.endswith('"integer", 6, c(2, 3), FALSE)')
+        with open(segments[0].path, 'rb') as f:
+            assert list(np.frombuffer(f.read(), '<i4')) == [0, 3, 1, 4, 2, 5]
+
+    def test_deno(self) -> None:
+        inter = self.make_command()
+        inter.let('matrix', np.arange(6, dtype='f8').reshape(2, 3))
+        assert inter.get(
+            'console.log(matrix[1][2], matrix[0].constructor.name)'
+        ).startswith('5 Float64Array')
+        inter.let('big', np.arange(100000, dtype='i4'))
+        assert inter['big'].length.to_python() == 100000
+        assert inter['Math.max'](np.int64(3), np.float32(2.5)).to_python() == 3
+        inter.close()
+
+
+class DenoTypedArray(DenoTestBase, unittest.TestCase):
+    def test_typed_array(self) -> None:
+        inter = self.make_command()
+        inter.get('var typed = new Float32Array([1.5, 2]);'
+                  'var buffer = new Uint8Array([1, 2, 3]).buffer;'
+                  'var numbers = [1, 2, 3]')
+        typed = inter['typed'].to_python()
+        assert typed.dtype == np.float32 and typed.tolist() == [1.5, 2]
+        assert inter['buffer'].to_python().tolist() == [1, 2, 3]
+        assert inter['numbers'].to_python() == [1, 2, 3]
+        numbers = inter['numbers'].to_numpy()
+        assert numbers.dtype == np.int32 and numbers.tolist() == [1, 2, 3]
+        inter.get('var big = Array.from({length: 100000}, (_, i) => i / 2)')
+        big = inter['big'].to_python()
+        assert isinstance(big, list) and big[-1] == 49999.5
+        inter.close()
+
+
+class DenoMemoize(DenoTestBase, unittest.TestCase):
+    def test_memoize(self) -> None:
+        inter = self.make_command()
+        inter.get('var calls = 0;'
+                  'var total = (x) => { calls += 1; return x.reduce((a, b) => a + b, 0); }')
+        total = inter['total'].memoize(maxsize=2)
+        first = total(np.arange(100000, dtype='f8'))
+        assert total(np.arange(100000, dtype='f8')) is first
+        assert total([1, 2]).to_python() == 3
+        assert inter['calls'].to_python() == 2
+        total([3, 4])
+        total(np.arange(100000, dtype='f8'))
+        assert inter['calls'].to_python() == 4
+        values = inter['total'].memoize(ttl=0, to_python=True)
+        assert values([1, 2]) == 3 and values([1, 2]) == 3
+        assert inter['calls'].to_python() == 6
+        inter.close()
+
+    def test_call_cache(self) -> None:
+        cache = CallCache(maxsize=10, max_bytes=100)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 30)
+        cache.get('a')
+        cache.set('c', 3, 30)
+        assert cache.get('b') is None and cache.get('a') == 1
+        cache.set('d', 4, 1000)
+        assert cache.get('d') is None and cache.bytes == 90
+
+
+class DenoChunks(DenoTestBase, unittest.TestCase):
+    def test_iter_chunks(self) -> None:
+        inter = self.make_command()
+        inter.let('values', list(range(10)))
+        chunks = list(inter['values'].iter_chunks(rows=4))
+        assert [list(chunk) for chunk in chunks] == [
+            [0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        inter.let('records', [{'x': i, 's': str(i)} for i in range(5)])
+        frames = list(inter['records'].iter_chunks(rows=3, prefetch=2))
+        assert [len(frame) for frame in frames] == [3, 2]
+        assert list(frames[1]['x']) == [3, 4]
+        inter.close()
+
+
+class DenoMetrics(DenoTestBase, unittest.TestCase):
+    def test_metrics(self) -> None:
+        inter = self.make_command()
+        assert inter.metrics is None
+        metrics = inter.instrument()
+        events = []
+        metrics.add_hook(lambda kind, name, value, labels: events.append(name))
+        inter.let('values', [1, 2, 3])
+        assert inter['values'].to_python() == [1, 2, 3]
+        assert inter['Math.max'](1, 2).to_python() == 2
+        text = metrics.export()
+        assert 'ninter_operations_total{operation="call"} 1' in text
+        assert 'ninter_conversions_total{direction="to_interpreter",type="list"} 1' in text
+        assert 'ninter_wait_seconds_count' in text
+        assert 'ninter_decode_seconds_bucket{le="+Inf"} 2' in text
+        assert 'ninter_bytes_in_total' in events
+        inter.uninstrument()
+        inter['values'].to_python()
+        assert metrics.export() == text
+        inter.close()
+
+
+class DenoBatch(DenoTestBase, unittest.TestCase):
+    def test_batch(self) -> None:
+        inter = self.make_command()
+        inter.let('values', list(range(100)))
+        with inter.batch() as batch:
+            futures = [batch.submit(inter[f'values[{n}]']) for n in range(100)]
+            raw = batch.submit('console.log(1 + 1)')
+        assert all(future.done() for future in futures)
+        assert [future.result() for future in futures] == list(range(100))
+        assert raw.result().strip() == '2'
+        assert inter.submit(inter['values.length']).result() == 100
+        inter.close()
+
+    def test_many(self) -> None:
+        # More responses than the pipe can hold.
+        inter = self.make_command()
+        inter.let('values', list(range(3000)))
+        with inter.batch() as batch:
+            futures = [batch.submit(inter[f'values[{n}]'])
+                       for n in range(3000)]
+        assert [future.result() for future in futures] == list(range(3000))
+        inter.close()
+
+
+class ImportTime(unittest.TestCase):
+    # Seconds which 'import ninter' may take.
+    budget = 0.5
+
+    def test_import_time(self) -> None:
+        code = ('import sys, time; start = time.perf_counter(); import ninter; '
+                'print(time.perf_counter() - start, '
+                '"numpy" in sys.modules, "pandas" in sys.modules)')
+        output = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True).stdout
+        seconds, numpy, pandas = output.split()
+        assert float(seconds) < self.budget
+        assert numpy == pandas == 'False'
+
+
+class Bench(unittest.TestCase):
+    def test_bench(self) -> None:
+        from ninter import bench
+        assert bench.percentile([1.0, 2.0, 3.0], 50) == 2.0
+        assert bench.percentile([1.0, 2.0], 90) == 1.9
+        report = bench.run(['deno'], sizes=[1, 10], repeat=2)
+        names = {result['name'] for result in report['results']}
+        assert names == {'startup', 'get', 'to_python', 'call',
+                         'set_vector', 'get_vector', 'frame'}
+        slower = {'results': [dict(result, p50=result['p50'] * 2)
+                              for result in report['results']]}
+        assert bench.compare(report, report) == []
+        assert len(bench.compare(slower, report)) == len(report['results'])
+
+
+class ChunkReaderTest(unittest.TestCase):
+    def test_read_until(self) -> None:
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b'KEY\n' + b'line\n' * 1000 + b'KEY\nrest\n12345')
+        os.close(write_fd)
+        # Small chunks make the key across the chunks.
+        reader = ChunkReader(read_fd, chunk_size=7)
+        assert reader.read_until(b'KEY\n') == b''
+        assert reader.read_until(b'KEY\n') == b'line\n' * 1000
+        assert reader.readline() == b'rest\n'
+        assert reader.read(3) == b'123'
+        assert reader.read(10) == b'45'
+        assert reader.read_until(b'KEY\n') is None
+        os.close(read_fd)
+
+
+class DenoFramed(unittest.TestCase):
+    def test_framed(self) -> None:
+        inter = Deno(framed=True)
+        assert inter.get('1 + 1').strip() == '2'
+        # A line which looks like stamp or header does not break it.
+        output = inter.get(r'console.log("[1] \x02ninter 1 ok 3\n"); 3')
+        assert output.endswith('3\n')
+        inter.let('values', [1, 2, 3])
+        assert inter['values'].to_python() == [1, 2, 3]
+        assert 'nope' in inter.get('nope.x')
+        assert inter['values.length'].to_python() == 3
+        inter.close()
+        assert inter.command.inter.poll() is not None
+
+    def test_syntax_error(self) -> None:
+        inter = Deno(framed=True)
+        assert 'SyntaxError' in inter.get('let x = ;')
+        # An incomplete line does not take the next line.
+        assert 'SyntaxError' in inter.get('1 +')
+        assert inter.get('1 + 1').strip() == '2'
+        inter.close()
+
+
+class RFramed(unittest.TestCase):
+    def test_syntax_error(self) -> None:
+        inter = R(framed=True)
+        assert 'unexpected' in inter.get('x <- ;')
+        assert 'unexpected' in inter.get('1 +')
+        assert inter.get('1 + 1; 2 + 2').split() == ['[1]', '2', '[1]', '4']
+        inter.close()
+        assert inter.command.inter.poll() is not None
+
+    def test_interrupt(self) -> None:
+        inter = R(framed=True)
+        inter['values'] = [1, 2, 3]
+        with self.assertRaises(InterpreterTimeout):
+            inter.get('Sys.sleep(10)', timeout=0.5)
+        # It was interrupted and not killed.
+        assert inter.command.inter.poll() is None
+        assert inter['values'].to_python() == [1.0, 2.0, 3.0]
+        inter.close()
+
+
+class DenoThreaded(unittest.TestCase):
+    def check(self, inter: Deno) -> None:
+        inter.let('values', list(range(40)))
+
+        def work(n: int) -> list:
+            results = []
+            for i in range(10):
+                index = (n * 10 + i) % 40
+                results.append(inter[f'values[{index}]'].to_python())
+                results.append(inter.get(f'console.log("t{n}-{i}")').strip())
+                results.append(inter.submit(
+                    f'console.log(values[{index}])', int).result())
+            return results
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            outputs = list(executor.map(work, range(8)))
+        for n, results in enumerate(outputs):
+            expected = []
+            for i in range(10):
+                index = (n * 10 + i) % 40
+                expected += [index, f't{n}-{i}', index]
+            assert results == expected
+        inter.close()
+
+    def test_shared_future(self) -> None:
+        inter = Deno(thread_safe=True)
+
+        def convert(text: str) -> int:
+            # Other threads wake while it converts.
+            time.sleep(0.3)
+            return int(text)
+
+        future = inter.submit(
+            'await new Promise((r) => setTimeout(r, 200)); console.log(7)',
+            convert)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(
+                lambda _: future.result(timeout=3), range(4)))
+        assert results == [7] * 4
+        # They did not wait until the timeout.
+        assert time.monotonic() - start < 2
+        inter.close()
+
+    def test_repl(self) -> None:
+        self.check(Deno(thread_safe=True))
+
+    def test_server(self) -> None:
+        self.check(Deno(server=True, thread_safe=True))
+
+    def test_garbage(self) -> None:
+        inter = Deno(server=True, thread_safe=True)
+        inter.collect_threshold = 10000
+
+        def work(n: int) -> None:
+            for i in range(20):
+                result = inter['Array'](n, i)
+                assert result.metadata()['length'] == 2
+                del result
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(work, range(8)))
+        assert inter.live_objects == 0
+        assert inter.collect() == 160
+        inter.close()
+
+
+class DenoBulk(DenoServerTestBase, unittest.TestCase):
+    def test_update_fetch(self) -> None:
+        inter = self.make_command()
+        values = {'a': [1, 2, 3], 'b': 'hello', 'c': {'k': 1},
+                  'd': list(range(5000))}
+        sent = inter.sent_num
+        inter.update(values)
+        fetched = inter.fetch(['a', 'b', 'c', 'd', 'new Uint8Array([1, 2])'])
+        assert inter.sent_num - sent == 2
+        assert fetched.pop('new Uint8Array([1, 2])').tolist() == [1, 2]
+        assert fetched == values
+        bridge = Bridge(inter)
+        bridge.update({'e': 5})
+        assert bridge.fetch(['e', 'b']) == {'e': 5, 'b': 'hello'}
+        assert inter.fetch([]) == {}
+        # Output which lost values is an error, not a short dict.
+        inter.command.make_fetch_many_command = (
+            lambda codes, paths, min_numbers: 'console.log(1)')
+        with self.assertRaises(InterpreterException):
+            inter.fetch(['a', 'b'])
+        inter.close()
+
+
+class PatientDenoCommand(DenoCommand):
+    def interrupt(self) -> bool:
+        # The computation ends by itself while resync.
+        return True
+
+
+class DenoTimeout(unittest.TestCase):
+    slow = 'await new Promise((r) => setTimeout(r, 500)); console.log("slow")'
+
+    def test_resync(self) -> None:
+        inter = Interpreter(PatientDenoCommand(), DenoObject)
+        inter.let('values', [1, 2, 3])
+        with self.assertRaises(InterpreterTimeout):
+            inter.get(self.slow, timeout=0.1)
+        assert inter['values'].to_python() == [1, 2, 3]
+        inter.timeout = 0.1
+        future = inter.submit(self.slow)
+        with self.assertRaises(TimeoutError):
+            future.result()
+        # The future keeps the error and does not wait again.
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=1)
+        assert inter.get('console.log(1)', timeout=5).strip() == '1'
+        inter.close()
+
+    def test_threaded(self) -> None:
+        inter = Interpreter(PatientDenoCommand(), DenoObject)
+        inter.start_reader()
+        with self.assertRaises(InterpreterTimeout):
+            inter.submit(self.slow).result(timeout=0.1)
+        assert inter.get('console.log(1)', timeout=5).strip() == '1'
+        inter.close()
+
+    def test_kill(self) -> None:
+        inter = Deno(server=True)
+        with self.assertRaises(InterpreterTimeout):
+            inter.get('while (true) {}', timeout=0.2)
+        # JavaScript can not be interrupted and Deno was killed.
+        assert inter.command.inter.poll() is not None
+        with self.assertRaises(InterpreterClosed):
+            inter.get('1')
+        inter.close()
+
+
+class DenoWarm(unittest.TestCase):
+    def test_warm(self) -> None:
+        keep_warm(DenoCommand, size=2, bootstrap='let warmed = 42')
+        try:
+            inters = [Deno() for _ in range(3)]
+            assert [inter['warmed'].to_python() for inter in inters] == [42] * 3
+            for inter in inters:
+                inter.close()
+        finally:
+            stop_warm()
+
+    def test_failed(self) -> None:
+        class Missing(DenoCommand):
+            args = ['ninter-no-such-interpreter']
+
+        keep_warm(Missing, size=1)
+        try:
+            with self.assertRaises(FileNotFoundError):
+                warm.take(Missing)
+        finally:
+            stop_warm()
+        assert warm.take(Missing) is None
+
+
+class DenoAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent(self) -> None:
+        deno = await AsyncDeno()
+        await deno.let('values', list(range(50)))
+        results = await asyncio.gather(
+            *[deno[f'values[{n}]'].to_python() for n in range(50)])
+        assert results == list(range(50))
+        doubled = await deno['(x) => x * 2'](21)
+        assert await doubled.to_python() == 42
+        assert (await deno['values'].metadata())['length'] == 50
+        await deno.close()
+
+
+class DenoPool(unittest.TestCase):
+    def test_map(self) -> None:
+        pool = InterpreterPool(Deno, size=2,
+                               setup='const double = (x) => x * 2')
+        assert pool.map('double', range(10)) == [n * 2 for n in range(10)]
+        assert pool.starmap('Math.max', [(1, 2), (4, 3)]) == [2, 4]
+        pool.workers[0].command.inter.kill()
+        pool.workers[0].command.inter.wait()
+        assert pool.check() == 1
+        assert pool.submit('double', 4).result() == 8
+        pool.close()
+
+
 def r_test() -> None:
     r = R()
     print('R Assign test')
@@ -86,7 +670,7 @@ def r_test() -> None:
     assert r['r_number'].to_python() == 9
     r['r_vector_int'] = [9, 4, 5, 1]
     r_vector = r['r_vector_int']
-    assert r['r_vector_int'].to_python() == [9., 4., 5., 1.]
+    assert r['r_vector_int'].to_python().tolist() == [9., 4., 5., 1.]
     r['r_dataframe'] = pd.DataFrame([9, 4, 5, 1])
     assert r['names(r_dataframe)'].to_python() == 'X0'
     assert str(r['r_dataframe'].to_python()) == str(
@@ -95,17 +679,30 @@ def r_test() -> None:
     assert (str(r['r_dataframe'].to_python())
             == str(pd.DataFrame([[9, 4, 5, 1], [4, 2, 9, 1]],
                                 columns=['X0', 'X1', 'X2', 'X3'])))
+    r['typed_dataframe'] = pd.DataFrame({
+        'a': [1.5, None], 'b': ['x', 'y"z'], 'c': pd.Categorical(['u', 'v'])})
+    typed = r['typed_dataframe'].to_python()
+    assert typed['b'].tolist() == ['x', 'y"z']
+    assert typed['c'].dtype == 'category'
     t_test = r['t.test']
+    hits = r.metadata.hits
+    assert t_test.to_python() is t_test
+    assert t_test.to_python() is t_test
+    assert r.metadata.hits == hits + 1
     names = r['names']
     assert names(t_test(r_vector, [1, 2, 4]))[0].to_python() == 'statistic'
     r['l'] = [3, 4, '2']
     assert r['l'].to_python() == ['3', '4', '2']
-    assert t_test(r_vector, [1, 2, 4, 5], kwargs={'paired': True})[
-        'p.value'].to_python() == 0.5285172
+    assert 0.5285171 < t_test(r_vector, [1, 2, 4, 5], kwargs={'paired': True})[
+        'p.value'].to_python() < 0.5285173
     r['long_data'] = list(range(200))
-    assert r['long_data'].to_python() == [float(i) for i in range(200)]
+    assert r['long_data'].to_python().tolist() == [float(i) for i in range(200)]
     r['long_data'] = list(range(10000))
-    assert r['long_data'].to_python() == [float(i) for i in range(10000)]
+    assert r['long_data'].to_python().tolist() == [float(i) for i in range(10000)]
+    assert r['1:5'].to_python().dtype == 'int32'
+    assert r['c(TRUE, NA, FALSE)'].to_python().mask.tolist() == [False, True, False]
+    assert r['complex(real=1, imaginary=2)'].to_python() == 1+2j
+    assert r['matrix(1:6, 2)'].to_python()[1].tolist() == [2, 4, 6]
     print('DF', r['r_dataframe'].to_python())
 
 # def r_bridge_test() -> None: